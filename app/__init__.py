@@ -7,5 +7,20 @@ Este pacote contém:
 - detection: detecção de tipo/severidade
 - formatters: validação e formatação de mensagens
 - services: integração com serviços externos (Discord)
+- http_pool: sessões HTTP com pool de conexões keep-alive
+- delivery: fila de entrega assíncrona ao Discord
+- outbox: log em disco das mensagens ainda não entregues
+- batching: agrupamento de alertas em mensagens multi-embed
+- ratelimit: buckets de rate limit do Discord por webhook
+- routing: tabela de roteamento de alertas para webhooks
+- circuit: circuit breaker por webhook e backoff com jitter
+- dedupe_sqlite: backend SQLite (WAL) do cache de dedupe
+- throttle: token bucket por host/tipo consultado antes do dedupe
+- allowlist: allowlists de containers compiladas (exato, glob, regex) com recarga do arquivo
+- suppression_persist: gravação write-behind (snapshot ou journal) do estado de supressão
+- suppression_sqlite: backend SQLite (WAL) indexado do estado de supressão
+- portainer_cache: snapshot da lista de containers por endpoint com consulta única (single-flight)
+- portainer_index: índice de nomes (exato e n-gramas) de cada snapshot de containers
+- metrics: contadores/histogramas em memória expostos em /metrics (Prometheus)
 - controller: criação do Flask app e endpoints
 """
@@ -0,0 +1,155 @@
+import fnmatch
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .constants import DEBUG_MODE, CONTAINER_ALLOWLIST_FILE, CONTAINER_ALLOWLIST_RELOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Políticas -> variável de ambiente com a lista (separada por vírgula)
+IGNORE = 'ignore'
+ALWAYS_NOTIFY = 'always_notify'
+PAUSED = 'paused'
+POLICY_ENV = {
+    IGNORE: 'CONTAINER_IGNORE_ALLOWLIST',
+    ALWAYS_NOTIFY: 'CONTAINER_ALWAYS_NOTIFY_ALLOWLIST',
+    PAUSED: 'CONTAINER_PAUSED_ALLOWLIST',
+}
+
+_NONE: FrozenSet[str] = frozenset()
+_GLOB_CHARS = re.compile(r'[*?\[]')
+# Nomes de containers se repetem muito; o resultado por nome fica em cache até o reload
+_CACHE_MAX = 10000
+
+
+def _split_env(value: str) -> List[str]:
+    return [s.strip() for s in (value or '').split(',') if s.strip()]
+
+
+class _Compiled:
+    __slots__ = ('exact', 'patterns', 'cache')
+
+    def __init__(self, entries: Dict[str, List[str]]):
+        # nome exato -> políticas; globs/regex -> (regex compilada, política)
+        exact: Dict[str, set] = {}
+        patterns: List[Tuple["re.Pattern", str]] = []
+        for policy, values in entries.items():
+            for raw in values:
+                value = str(raw).strip()
+                if not value:
+                    continue
+                if value.startswith('re:'):
+                    try:
+                        patterns.append((re.compile(value[3:], re.IGNORECASE), policy))
+                    except re.error as exc:
+                        logger.warning(f"Allowlist '{policy}': regex inválida '{value}': {exc}")
+                elif _GLOB_CHARS.search(value):
+                    patterns.append((re.compile(fnmatch.translate(value.lower())), policy))
+                else:
+                    exact.setdefault(value.lower(), set()).add(policy)
+        self.exact = {name: frozenset(policies) for name, policies in exact.items()}
+        self.patterns = patterns
+        self.cache: Dict[str, FrozenSet[str]] = {}
+
+
+class AllowlistMatcher:
+    """
+    Allowlists de containers (ignorar, sempre notificar, paused permitido) compiladas uma
+    vez num único matcher. Cada entrada pode ser um nome exato, um glob (`worker-*`) ou
+    uma regex (`re:^batch-\\d+$`); nomes são comparados sem diferenciar maiúsculas.
+
+    policies(nome) devolve todas as políticas do container numa única consulta: nome
+    exato via dict, depois os padrões; o resultado por nome fica em cache.
+
+    Fontes: as variáveis CONTAINER_*_ALLOWLIST, lidas uma vez na criação (o ambiente de
+    um processo não muda depois do start), e, opcionalmente, um JSON
+    (CONTAINER_ALLOWLIST_FILE) com as listas `ignore`, `always_notify` e `paused`.
+    A cada CONTAINER_ALLOWLIST_RELOAD_SECONDS o matcher confere o mtime do arquivo e
+    recompila se ele mudou; alterar as variáveis exige restart.
+    """
+
+    def __init__(self, config_file: Optional[str] = CONTAINER_ALLOWLIST_FILE,
+                 reload_seconds: float = CONTAINER_ALLOWLIST_RELOAD_SECONDS):
+        self.config_file = config_file
+        self.reload_seconds = max(0.0, reload_seconds)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._next_check = 0.0
+        self._compiled = _Compiled({})
+        self._env_entries = {policy: _split_env(os.getenv(env, '')) for policy, env in POLICY_ENV.items()}
+        self.reload()
+
+    def _current_signature(self) -> float:
+        if not self.config_file:
+            return 0.0
+        try:
+            return os.path.getmtime(self.config_file)
+        except OSError:
+            return 0.0
+
+    def _load_file(self) -> Dict[str, List[str]]:
+        if not self.config_file or not os.path.exists(self.config_file):
+            return {}
+        try:
+            with open(self.config_file, 'r') as f:
+                data = json.load(f)
+        except Exception as exc:
+            logger.warning(f"Falha ao carregar allowlist de {self.config_file}: {exc}")
+            return {}
+        result = {}
+        for policy in POLICY_ENV:
+            values = data.get(policy) if isinstance(data, dict) else None
+            if isinstance(values, str):
+                values = _split_env(values)
+            if isinstance(values, list):
+                result[policy] = values
+        return result
+
+    def reload(self) -> bool:
+        """Recompila se o arquivo mudou (ou na primeira carga). Retorna True se recompilou."""
+        signature = self._current_signature()
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_seconds
+            if signature == self._signature:
+                return False
+            entries = {policy: list(values) for policy, values in self._env_entries.items()}
+            for policy, values in self._load_file().items():
+                entries[policy] = entries[policy] + values
+            self._compiled = _Compiled(entries)
+            self._signature = signature
+        if DEBUG_MODE:
+            total = sum(len(v) for v in entries.values())
+            print(f"[DEBUG] Allowlists compiladas ({total} entradas)")
+        return True
+
+    def policies(self, container_name: Optional[str]) -> FrozenSet[str]:
+        """Todas as políticas aplicáveis ao container (vazio se nenhuma)."""
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        name = (container_name or '').strip().lower()
+        if not name:
+            return _NONE
+        compiled = self._compiled
+        result = compiled.cache.get(name)
+        if result is not None:
+            return result
+        result = compiled.exact.get(name, _NONE)
+        if compiled.patterns:
+            matched = {policy for regex, policy in compiled.patterns if policy not in result and regex.fullmatch(name)}
+            if matched:
+                result = result | matched
+        if len(compiled.cache) >= _CACHE_MAX:
+            compiled.cache.clear()
+        compiled.cache[name] = result
+        return result
+
+    def is_always_notify(self, container_name: Optional[str]) -> bool:
+        return ALWAYS_NOTIFY in self.policies(container_name)
+
+
+container_allowlist = AllowlistMatcher()
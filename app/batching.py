@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, List
+
+# Limites de uma mensagem de webhook do Discord
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_CONTENT_CHARS = 2000
+DISCORD_MAX_EMBED_TOTAL_CHARS = 6000
+
+CONTENT_SEPARATOR = "\n\n"
+
+
+def embed_size(embed: Dict) -> int:
+    """Conta os caracteres de um embed da forma que o Discord contabiliza o limite total."""
+    if not isinstance(embed, dict):
+        return 0
+    size = len(str(embed.get('title') or '')) + len(str(embed.get('description') or ''))
+    footer = embed.get('footer')
+    if isinstance(footer, dict):
+        size += len(str(footer.get('text') or ''))
+    author = embed.get('author')
+    if isinstance(author, dict):
+        size += len(str(author.get('name') or ''))
+    for field in embed.get('fields') or []:
+        if isinstance(field, dict):
+            size += len(str(field.get('name') or '')) + len(str(field.get('value') or ''))
+    return size
+
+
+def pack_messages(items: Iterable[Dict]) -> List[Dict]:
+    """
+    Agrupa itens {'content', 'embeds'} (um por alerta) no menor número de mensagens
+    que respeitam os limites do Discord: 10 embeds, 2000 caracteres de content e
+    6000 caracteres somando os embeds. A ordem dos alertas é preservada.
+
+    Cada mensagem retornada tem 'content', 'embeds' e 'items' (itens de origem).
+    Um item que sozinho já excede algum limite vai numa mensagem própria, como antes.
+    """
+    messages: List[Dict] = []
+    current = None
+
+    for item in items:
+        content = item.get('content')
+        embeds = list(item.get('embeds') or [])
+        content_len = len(content) if content else 0
+        embeds_chars = sum(embed_size(e) for e in embeds)
+
+        if current is not None:
+            sep = len(CONTENT_SEPARATOR) if (content and current['content_len']) else 0
+            fits = (
+                len(current['embeds']) + len(embeds) <= DISCORD_MAX_EMBEDS
+                and current['content_len'] + sep + content_len <= DISCORD_MAX_CONTENT_CHARS
+                and current['embeds_chars'] + embeds_chars <= DISCORD_MAX_EMBED_TOTAL_CHARS
+            )
+            if fits:
+                if content:
+                    current['contents'].append(content)
+                    current['content_len'] += sep + content_len
+                current['embeds'].extend(embeds)
+                current['embeds_chars'] += embeds_chars
+                current['items'].append(item)
+                continue
+            messages.append(current)
+
+        current = {
+            'contents': [content] if content else [],
+            'content_len': content_len,
+            'embeds': embeds,
+            'embeds_chars': embeds_chars,
+            'items': [item],
+        }
+
+    if current is not None:
+        messages.append(current)
+
+    return [
+        {
+            'content': CONTENT_SEPARATOR.join(m['contents']) if m['contents'] else None,
+            'embeds': m['embeds'],
+            'items': m['items'],
+        }
+        for m in messages
+    ]
@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from typing import Dict
+
+from .constants import (
+    DEBUG_MODE,
+    DISCORD_BREAKER_FAILURE_THRESHOLD,
+    DISCORD_BREAKER_OPEN_SECONDS,
+    DISCORD_BREAKER_MAX_OPEN_SECONDS,
+)
+
+
+def backoff_with_jitter(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial com jitter ("equal jitter"): metade fixa, metade aleatória."""
+    delay = min(cap, base * (2 ** max(0, attempt)))
+    return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+
+class CircuitOpenError(Exception):
+    """Envio recusado localmente: o circuito do webhook está aberto."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"circuito aberto (nova tentativa em {retry_in:.1f}s)")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por webhook:
+    - closed: envia normalmente; N falhas consecutivas (erro de rede/timeout/5xx) abrem o circuito
+    - open: recusa envios sem tocar a rede até o fim da janela (backoff exponencial + jitter)
+    - half_open: deixa passar uma única requisição de prova; sucesso fecha, falha reabre
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = DISCORD_BREAKER_FAILURE_THRESHOLD,
+                 open_seconds: float = DISCORD_BREAKER_OPEN_SECONDS,
+                 max_open_seconds: float = DISCORD_BREAKER_MAX_OPEN_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = max(0.1, open_seconds)
+        self.max_open_seconds = max(self.open_seconds, max_open_seconds)
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opens = 0  # aberturas consecutivas (escala o backoff)
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._last_error = None
+        self._changed_at = time.time()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            if DEBUG_MODE:
+                print(f"[DEBUG] CircuitBreaker: {self.state} -> {state}")
+            self.state = state
+            self._changed_at = time.time()
+
+    def retry_in(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() < self._open_until:
+                    return False
+                self._set_state(self.HALF_OPEN)
+                self._probe_in_flight = False
+            # half_open: apenas uma requisição de prova por vez
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opens = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self, error: str = ''):
+        with self._lock:
+            self._last_error = error or self._last_error
+            self._probe_in_flight = False
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                open_for = backoff_with_jitter(self._opens, self.open_seconds, self.max_open_seconds)
+                self._opens += 1
+                self._open_until = time.monotonic() + open_for
+                self._set_state(self.OPEN)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'consecutive_opens': self._opens,
+                'retry_in_seconds': round(self.retry_in(), 3) if self.state == self.OPEN else 0.0,
+                'last_error': self._last_error,
+                'since': self._changed_at,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Um CircuitBreaker por webhook (um canal fora do ar não bloqueia os demais)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker())
+        return breaker
+
+    def items(self):
+        with self._lock:
+            return list(self._breakers.items())
+
+
+discord_breakers = CircuitBreakerRegistry()
@@ -2,13 +2,65 @@ import os
 
 # Configurações globais de ambiente
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+# Tabela de roteamento label -> webhooks (JSON); vazio = tudo vai para DISCORD_WEBHOOK_URL
+DISCORD_ROUTES_FILE = os.getenv("DISCORD_ROUTES_FILE")
 APP_PORT = int(os.getenv("APP_PORT", "5001"))
 DEBUG_MODE = os.getenv("DEBUG_MODE", "False").lower() == "true"
+# Servidor HTTP: 'production' (waitress, multi-thread) ou 'development' (servidor do Flask)
+SERVER_MODE = os.getenv("SERVER_MODE", "production").strip().lower()
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "8"))
+
+# Entrega ao Discord (pool de conexões keep-alive)
+DISCORD_POOL_SIZE = int(os.getenv("DISCORD_POOL_SIZE", "10"))
+DISCORD_CONNECT_TIMEOUT_SECONDS = float(os.getenv("DISCORD_CONNECT_TIMEOUT_SECONDS", "3"))
+DISCORD_READ_TIMEOUT_SECONDS = float(os.getenv("DISCORD_READ_TIMEOUT_SECONDS", "10"))
+# Rate limit do Discord (buckets por webhook a partir dos headers X-RateLimit-*)
+DISCORD_RATE_LIMIT_MAX_RETRIES = int(os.getenv("DISCORD_RATE_LIMIT_MAX_RETRIES", "3"))
+DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+# Circuit breaker por webhook (backoff exponencial com jitter enquanto aberto)
+DISCORD_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DISCORD_BREAKER_FAILURE_THRESHOLD", "5"))
+DISCORD_BREAKER_OPEN_SECONDS = float(os.getenv("DISCORD_BREAKER_OPEN_SECONDS", "5"))
+DISCORD_BREAKER_MAX_OPEN_SECONDS = float(os.getenv("DISCORD_BREAKER_MAX_OPEN_SECONDS", "300"))
+
+# Fila de entrega assíncrona (o /alert responde 202 antes do Discord)
+DELIVERY_ASYNC_ENABLED = os.getenv("DELIVERY_ASYNC_ENABLED", "true").lower() == "true"
+DELIVERY_QUEUE_MAX = int(os.getenv("DELIVERY_QUEUE_MAX", "1000"))
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "1"))
+DELIVERY_DRAIN_TIMEOUT_SECONDS = float(os.getenv("DELIVERY_DRAIN_TIMEOUT_SECONDS", "10"))
+# Buffer local de reenvio (falhas e circuito aberto), com backoff exponencial + jitter
+DELIVERY_RETRY_BUFFER_MAX = int(os.getenv("DELIVERY_RETRY_BUFFER_MAX", "500"))
+DELIVERY_RETRY_BASE_SECONDS = float(os.getenv("DELIVERY_RETRY_BASE_SECONDS", "1"))
+DELIVERY_RETRY_MAX_SECONDS = float(os.getenv("DELIVERY_RETRY_MAX_SECONDS", "60"))
+# Coalescing: agrupa alertas próximos numa mensagem com até 10 embeds
+DISCORD_COALESCE_ENABLED = os.getenv("DISCORD_COALESCE_ENABLED", "true").lower() == "true"
+DISCORD_COALESCE_WINDOW_MS = int(os.getenv("DISCORD_COALESCE_WINDOW_MS", "500"))
+DISCORD_COALESCE_MAX_ITEMS = int(os.getenv("DISCORD_COALESCE_MAX_ITEMS", "50"))
+# Outbox em disco (mensagens não entregues sobrevivem a restart)
+DISCORD_OUTBOX_ENABLED = os.getenv("DISCORD_OUTBOX_ENABLED", "true").lower() == "true"
+DISCORD_OUTBOX_FILE = os.getenv("DISCORD_OUTBOX_FILE", "/app/data/discord-outbox.jsonl")
+DISCORD_OUTBOX_FSYNC_INTERVAL_MS = int(os.getenv("DISCORD_OUTBOX_FSYNC_INTERVAL_MS", "200"))
+DISCORD_OUTBOX_COMPACT_EVERY = int(os.getenv("DISCORD_OUTBOX_COMPACT_EVERY", "500"))
+# Intervalo para reenfileirar os pendentes descartados em runtime (fila cheia/buffer lotado)
+DISCORD_OUTBOX_REPLAY_SECONDS = float(os.getenv("DISCORD_OUTBOX_REPLAY_SECONDS", "30"))
 
 # Dedupe/cooldown de alertas
 ALERT_DEDUP_ENABLED = os.getenv("ALERT_DEDUP_ENABLED", "true").lower() == "true"
 ALERT_COOLDOWN_SECONDS = int(os.getenv("ALERT_COOLDOWN_SECONDS", "3600"))  # 60 minutos por padrão
 ALERT_CACHE_MAX = int(os.getenv("ALERT_CACHE_MAX", "5000"))
+# Backend do dedupe: 'memory' (por processo) ou 'sqlite' (arquivo WAL compartilhado entre réplicas/restarts)
+ALERT_DEDUP_BACKEND = os.getenv("ALERT_DEDUP_BACKEND", "memory").strip().lower()
+ALERT_DEDUP_DB_FILE = os.getenv("ALERT_DEDUP_DB_FILE", "/app/data/dedupe.sqlite3")
+ALERT_DEDUP_FLUSH_INTERVAL_MS = int(os.getenv("ALERT_DEDUP_FLUSH_INTERVAL_MS", "200"))
+# Fingerprints como digests de 64 bits numa tabela compacta (menos memória com muitos containers)
+ALERT_DEDUP_COMPACT = os.getenv("ALERT_DEDUP_COMPACT", "false").lower() == "true"
+
+# Throttle por host/tipo (token bucket) consultado antes do dedupe por fingerprint
+# (um alerta duplicado devolve o token)
+ALERT_THROTTLE_ENABLED = os.getenv("ALERT_THROTTLE_ENABLED", "false").lower() == "true"
+ALERT_THROTTLE_BURST = int(os.getenv("ALERT_THROTTLE_BURST", "10"))
+ALERT_THROTTLE_RATE_PER_MINUTE = float(os.getenv("ALERT_THROTTLE_RATE_PER_MINUTE", "6"))
+ALERT_THROTTLE_MAX_BUCKETS = int(os.getenv("ALERT_THROTTLE_MAX_BUCKETS", "10000"))
+ALERT_THROTTLE_REPORT_INTERVAL_SECONDS = int(os.getenv("ALERT_THROTTLE_REPORT_INTERVAL_SECONDS", "300"))
 
 # Integração com Portainer CE
 CONTAINER_VALIDATE_WITH_PORTAINER = os.getenv("CONTAINER_VALIDATE_WITH_PORTAINER", "false").lower() == "true"
@@ -19,6 +71,25 @@ PORTAINER_VERIFY_TLS = os.getenv("PORTAINER_VERIFY_TLS", "true").lower() == "tru
 PORTAINER_FAIL_OPEN = os.getenv("PORTAINER_FAIL_OPEN", "true").lower() == "true"
 PORTAINER_ENDPOINT_MAP_FILE = os.getenv("PORTAINER_ENDPOINT_MAP_FILE")
 PORTAINER_STRICT_NAME_MATCH = os.getenv("PORTAINER_STRICT_NAME_MATCH", "false").lower() == "true"
+# Pool de conexões keep-alive com o Portainer (0 = automático pelo nº de endpoints/workers)
+PORTAINER_POOL_SIZE = int(os.getenv("PORTAINER_POOL_SIZE", "0"))
+# Retentativas do transporte (GET) em falha de conexão e 502/503/504, com backoff
+PORTAINER_MAX_RETRIES = int(os.getenv("PORTAINER_MAX_RETRIES", "2"))
+PORTAINER_RETRY_BACKOFF_SECONDS = float(os.getenv("PORTAINER_RETRY_BACKOFF_SECONDS", "0.2"))
+# Snapshot da lista de containers por endpoint: validade (s) e janela extra servindo o antigo
+# enquanto atualiza em segundo plano (stale-while-revalidate)
+PORTAINER_CONTAINER_CACHE_TTL_SECONDS = float(os.getenv("PORTAINER_CONTAINER_CACHE_TTL_SECONDS", "5"))
+PORTAINER_CONTAINER_CACHE_STALE_SECONDS = float(os.getenv("PORTAINER_CONTAINER_CACHE_STALE_SECONDS", "10"))
+# Sem snapshot em cache, verificações pontuais pedem ao Docker só os containers com o nome
+# procurado (parâmetro `filters`) em vez da lista inteira
+PORTAINER_SERVER_FILTERS = os.getenv("PORTAINER_SERVER_FILTERS", "true").lower() == "true"
+# Verificação paralela dos alertas de container de um mesmo payload do Grafana
+PORTAINER_VERIFY_WORKERS = int(os.getenv("PORTAINER_VERIFY_WORKERS", "8"))
+PORTAINER_VERIFY_DEADLINE_SECONDS = float(os.getenv("PORTAINER_VERIFY_DEADLINE_SECONDS", "5"))
+# Se true, alertas de container do Grafana também são verificados no Portainer (estado real
+# na mensagem e na supressão); por padrão o Grafana só formata e o Portainer fica para o
+# endpoint e o sibling blue/green
+PORTAINER_VERIFY_GRAFANA_ALERTS = os.getenv("PORTAINER_VERIFY_GRAFANA_ALERTS", "false").lower() == "true"
 
 # Monitoramento ativo via Portainer (polling)
 PORTAINER_ACTIVE_MONITOR = os.getenv("PORTAINER_ACTIVE_MONITOR", "true").lower() == "true"
@@ -26,6 +97,10 @@ PORTAINER_MONITOR_INTERVAL_SECONDS = int(os.getenv("PORTAINER_MONITOR_INTERVAL_S
 PORTAINER_MONITOR_ENDPOINTS = os.getenv("PORTAINER_MONITOR_ENDPOINTS", "").strip()
 PORTAINER_MONITOR_DOWN_CONFIRMATIONS = int(os.getenv("PORTAINER_MONITOR_DOWN_CONFIRMATIONS", "1"))
 PORTAINER_MONITOR_SCOPE = os.getenv("PORTAINER_MONITOR_SCOPE", "map").strip().lower()  # 'map' | 'all'
+# Endpoints consultados em paralelo por ciclo e prazo (s) de cada consulta; quem passa do
+# prazo fica para o próximo ciclo sem atrasar os demais
+PORTAINER_MONITOR_WORKERS = int(os.getenv("PORTAINER_MONITOR_WORKERS", "8"))
+PORTAINER_MONITOR_ENDPOINT_DEADLINE_SECONDS = float(os.getenv("PORTAINER_MONITOR_ENDPOINT_DEADLINE_SECONDS", "10"))
 # Se true, PortainerMonitor é a ÚNICA fonte de alertas de container (ignora alertas de container do Grafana)
 PORTAINER_MONITOR_ONLY_SOURCE = os.getenv("PORTAINER_MONITOR_ONLY_SOURCE", "true").lower() == "true"
 
@@ -34,19 +109,25 @@ CONTAINER_SUPPRESS_REPEATS = os.getenv("CONTAINER_SUPPRESS_REPEATS", "true").low
 CONTAINER_SUPPRESS_TTL_SECONDS = int(os.getenv("CONTAINER_SUPPRESS_TTL_SECONDS", "86400"))  # 24h
 CONTAINER_SUPPRESS_PERSIST = os.getenv("CONTAINER_SUPPRESS_PERSIST", "true").lower() == "true"
 CONTAINER_SUPPRESS_STATE_FILE = os.getenv("CONTAINER_SUPPRESS_STATE_FILE", "/tmp/proxy-alertmanager-suppression-state.json")
-_paused_allowlist_env = os.getenv("CONTAINER_PAUSED_ALLOWLIST", "").strip()
-CONTAINER_PAUSED_ALLOWLIST = set([s.strip() for s in _paused_allowlist_env.split(",") if s.strip()])
+# Gravação write-behind do estado: debounce (ms) e máximo de chaves alteradas antes de gravar
+CONTAINER_SUPPRESS_FLUSH_INTERVAL_MS = int(os.getenv("CONTAINER_SUPPRESS_FLUSH_INTERVAL_MS", "1000"))
+CONTAINER_SUPPRESS_FLUSH_MAX_DIRTY = int(os.getenv("CONTAINER_SUPPRESS_FLUSH_MAX_DIRTY", "500"))
+# Formato da persistência: 'snapshot' (arquivo inteiro), 'journal' (append por mudança + compactação)
+# ou 'sqlite' (banco WAL indexado em CONTAINER_SUPPRESS_DB_FILE)
+CONTAINER_SUPPRESS_PERSIST_MODE = os.getenv("CONTAINER_SUPPRESS_PERSIST_MODE", "snapshot").strip().lower()
+CONTAINER_SUPPRESS_DB_FILE = os.getenv("CONTAINER_SUPPRESS_DB_FILE", "/app/data/suppression.sqlite3")
+CONTAINER_SUPPRESS_JOURNAL_MAX_BYTES = int(os.getenv("CONTAINER_SUPPRESS_JOURNAL_MAX_BYTES", "1048576"))
 
 # Supressão Blue/Green deployment
 BLUE_GREEN_SUPPRESSION_ENABLED = os.getenv("BLUE_GREEN_SUPPRESSION_ENABLED", "true").lower() == "true"
 
-# Containers que NUNCA devem ser suprimidos (sempre notificar)
-_always_notify_allowlist_env = os.getenv("CONTAINER_ALWAYS_NOTIFY_ALLOWLIST", "").strip()
-CONTAINER_ALWAYS_NOTIFY_ALLOWLIST = set([s.strip() for s in _always_notify_allowlist_env.split(",") if s.strip()])
-
-# Containers que devem ser completamente ignorados (sem alertas em nenhum estado)
-_ignore_allowlist_env = os.getenv("CONTAINER_IGNORE_ALLOWLIST", "").strip()
-CONTAINER_IGNORE_ALLOWLIST = set([s.strip() for s in _ignore_allowlist_env.split(",") if s.strip()])
+# Allowlists de containers: CONTAINER_PAUSED_ALLOWLIST (paused permitido),
+# CONTAINER_ALWAYS_NOTIFY_ALLOWLIST (nunca suprimir) e CONTAINER_IGNORE_ALLOWLIST (ignorar)
+# são lidas uma vez, no start, por app/allowlist.py.
+# Allowlists adicionais em JSON ({"ignore": [...], "always_notify": [...], "paused": [...]}),
+# recarregado quando o arquivo muda (mtime); entradas aceitam nome exato, glob (worker-*) ou 're:<regex>'
+CONTAINER_ALLOWLIST_FILE = os.getenv("CONTAINER_ALLOWLIST_FILE", "")
+CONTAINER_ALLOWLIST_RELOAD_SECONDS = float(os.getenv("CONTAINER_ALLOWLIST_RELOAD_SECONDS", "10"))
 
 # Configurações de tipos de alertas com níveis de severidade
 ALERT_CONFIGS = {
@@ -1,37 +1,78 @@
 from flask import Flask, request
 import os
 import json
+import time
 
 from .constants import ALERT_CONFIGS, APP_PORT, DEBUG_MODE, SEVERITY_LEVELS, ALERT_DEDUP_ENABLED, ALERT_COOLDOWN_SECONDS, ALERT_CACHE_MAX
-from .constants import CONTAINER_ALWAYS_NOTIFY_ALLOWLIST
 from .constants import CONTAINER_SUPPRESS_REPEATS
 from .constants import PORTAINER_MONITOR_ONLY_SOURCE
-from .dedupe import TTLCache, build_alert_fingerprint
+from .delivery import delivery_queue, deliver, send_direct, start_delivery_queue, circuit_snapshot
+from .routing import discord_router
+from .metrics import metrics_registry, ALERT_STAGE_SECONDS, ALERTS_RECEIVED
+from .dedupe import build_dedupe_cache, build_alert_fingerprint
+from .throttle import alert_throttle, throttle_host
+from .allowlist import container_allowlist
 from .utils import format_timestamp, extract_metric_value_enhanced, format_metric_value, _is_meaningful
 from .enrichment import extract_real_ip_and_source, build_server_location
 from .detection import detect_alert_type, get_severity_level, get_severity_config, is_container_alert
 from .formatters import extract_container_info, format_container_alert
 from .portainer import portainer_client
+from .verification import portainer_verifier
 from .portainer_monitor import start_portainer_monitor
-from .services import send_discord_payload
-from .suppression import ContainerSuppressor, compute_state, build_container_key
+from .suppression import container_suppressor, compute_state
 
 
 def create_app():
     app = Flask(__name__)
-    # Cache de dedupe (em memória, por processo)
-    dedupe_cache = TTLCache(ttl_seconds=ALERT_COOLDOWN_SECONDS, max_size=ALERT_CACHE_MAX)
-    # Supressor de repetição (por container)
-    container_suppressor = ContainerSuppressor()
+    # Cache de dedupe (memória por processo ou SQLite compartilhado, ver ALERT_DEDUP_BACKEND)
+    dedupe_cache = build_dedupe_cache(ttl_seconds=ALERT_COOLDOWN_SECONDS, max_size=ALERT_CACHE_MAX)
+
+    # Fila de entrega assíncrona ao Discord (se habilitada)
+    start_delivery_queue()
+    # Relatório periódico dos alertas descartados pelo throttle (se habilitado)
+    alert_throttle.start()
 
     @app.route('/health', methods=['GET'])
     def health():
         return {'status': 'ok', 'service': 'grafana-discord-proxy'}, 200
 
+    @app.route('/delivery', methods=['GET'])
+    def delivery_stats():
+        return delivery_queue.stats(), 200
+
+    @app.route('/delivery/circuit', methods=['GET'])
+    def delivery_circuit():
+        return circuit_snapshot(), 200
+
+    @app.route('/throttle', methods=['GET'])
+    def throttle_stats():
+        return alert_throttle.stats(), 200
+
+    @app.route('/suppression', methods=['GET'])
+    def suppression_list():
+        # Containers com supressão ativa; ?state=exited filtra pelo último estado visto
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        except ValueError:
+            return {'error': 'limit inválido'}, 400
+        containers = container_suppressor.suppressed(state=request.args.get('state') or None, limit=limit)
+        body = {'count': len(containers), 'containers': containers}
+        # Backend SQLite: a lista reflete o último flush; pending_writes ainda não gravadas
+        pending = container_suppressor.pending_writes()
+        if pending is not None:
+            body['pending_writes'] = pending
+        return body, 200
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
     @app.route('/alert', methods=['POST'])
     def alert():
+        started = time.perf_counter()
         try:
-            data = request.json
+            with ALERT_STAGE_SECONDS.time(stage='parse'):
+                data = request.json
             if DEBUG_MODE:
                 print(f"[DEBUG] Received data: {data}")
 
@@ -43,6 +84,8 @@ def create_app():
             if DEBUG_MODE:
                 print(f"[ERROR] {str(e)}")
             return f'Error: {str(e)}', 500
+        finally:
+            ALERT_STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
 
     # Inicia monitoramento ativo via Portainer (se habilitado)
     try:
@@ -72,18 +115,15 @@ def create_app():
                         print(f"[DEBUG] - {alert['alert_type']}: {alert['host_info']['ip']} = {alert['metric_value']}")
 
                 message = format_enhanced_alert_message(alerts)
-                resp = send_discord_payload(content=message)
-                return '', resp.status_code
+                return '', send_direct(content=message)
             else:
-                resp = send_discord_payload(content=f"📢 **ALERTA RECEBIDO**\n```\n{text_content}\n```")
-                return '', resp.status_code
+                return '', send_direct(content=f"📢 **ALERTA RECEBIDO**\n```\n{text_content}\n```")
 
         except Exception as e:
             if DEBUG_MODE:
                 print(f"[DEBUG] Erro ao processar template minimal: {e}")
 
-            resp = send_discord_payload(content=f"⚠️ **ALERTA** (processamento simplificado)\n```\n{request.get_data(as_text=True)}\n```")
-            return '', resp.status_code
+            return '', send_direct(content=f"⚠️ **ALERTA** (processamento simplificado)\n```\n{request.get_data(as_text=True)}\n```")
 
     def enrich_alert_data(alert_data):
         for alert in alert_data.get('alerts', []):
@@ -133,11 +173,52 @@ def create_app():
         reason = result.get('error') or 'não verificado'
         return f"ℹ️ {reason}"
 
+    def prefetch_portainer(alerts):
+        """
+        Consultas ao Portainer (estado do container, endpoint e sibling blue/green) de
+        todos os alertas de container do payload, em paralelo e com prazo; retorna um item
+        por alerta, na ordem. Só com PORTAINER_VERIFY_GRAFANA_ALERTS=true.
+        """
+        lookups = [None] * len(alerts)
+        if PORTAINER_MONITOR_ONLY_SOURCE or not portainer_verifier.verify_state or not portainer_client.enabled:
+            return lookups
+        indexes, jobs = [], []
+        for idx, alert_data in enumerate(alerts):
+            labels = alert_data.get('labels', {})
+            annotations = alert_data.get('annotations', {})
+            if detect_alert_type(labels, annotations, labels.get('alertname', 'Alerta')) != 'container':
+                continue
+            enriched_info = alert_data.get('enriched_data', {})
+            real_ip = enriched_info.get('real_ip')
+            clean_host = enriched_info.get('clean_host', 'unknown')
+            host_for_endpoint = real_ip if real_ip and real_ip != 'unknown' else clean_host
+            if not host_for_endpoint or host_for_endpoint == 'unknown':
+                continue
+            container_info = enriched_info.get('container_context', {})
+            container_name = container_info.get('container_name') or labels.get('container') or labels.get('container_name')
+            # Mesmo valor da métrica que o loop passa ao ContainerSuppressor (compute_state)
+            description = annotations.get('description', '').replace('"', '').strip() or annotations.get('summary', 'Sem descrição disponível')
+            metric_value = get_metric_value(alert_data.get('values', {}), alert_data.get('valueString', ''), 'container', False, description=description)
+            indexes.append(idx)
+            jobs.append((host_for_endpoint, labels, container_name, alert_data.get('status', 'unknown'), metric_value))
+        if not jobs:
+            return lookups
+        with ALERT_STAGE_SECONDS.time(stage='portainer'):
+            results = portainer_verifier.verify_many(jobs)
+        for idx, lookup in zip(indexes, results):
+            lookups[idx] = lookup
+        return lookups
+
     def handle_grafana_alert(data):
-        enriched_data = enrich_alert_data(data)
+        with ALERT_STAGE_SECONDS.time(stage='enrich'):
+            enriched_data = enrich_alert_data(data)
         processed_alerts = []
+        # Consultas ao Portainer do payload inteiro antes do loop (pool limitado + prazo)
+        portainer_lookups = prefetch_portainer(enriched_data['alerts'])
 
-        for alert_data in enriched_data['alerts']:
+        for idx, alert_data in enumerate(enriched_data['alerts']):
+            build_started = time.perf_counter()
+            portainer_lookup = portainer_lookups[idx] or {}
             labels = alert_data.get('labels', {})
             annotations = alert_data.get('annotations', {})
             values = alert_data.get('values', {})
@@ -160,6 +241,7 @@ def create_app():
 
             alert_status = alert_data.get('status', 'unknown')
             is_firing = alert_status == 'firing'
+            ALERTS_RECEIVED.inc(alert_type=alert_type, status=alert_status)
 
             if is_firing:
                 severity_level = get_severity_level(metric_value, alert_type)
@@ -184,7 +266,7 @@ def create_app():
 
             value_text = format_metric_value(metric_value, config['unit'])
 
-            portainer_result = None
+            portainer_result = portainer_lookup.get('portainer_result')
 
             if alert_type == 'container':
                 # Se PORTAINER_MONITOR_ONLY_SOURCE=true, ignora alertas de container do Grafana
@@ -204,29 +286,33 @@ def create_app():
                     description,
                     severity_config,
                     get_metric_value,
-                    portainer_result=None,  # Grafana não consulta Portainer, apenas formata
+                    # Grafana não consulta Portainer, apenas formata (None), salvo com
+                    # PORTAINER_VERIFY_GRAFANA_ALERTS=true
+                    portainer_result=portainer_result,
                 )
 
                 # LÓGICA DE SUPRESSÃO POR ESTADO (apenas containers)
+                suppression_started = time.perf_counter()
                 try:
                     current_state = compute_state(portainer_result, metric_value, alert_status)
                     container_info = alert_data.get('enriched_data', {}).get('container_context', {})
                     container_name = container_info.get('container_name') or labels.get('container') or labels.get('container_name')
                     host_key = real_ip or clean_host
-                    key = build_container_key(host_key, labels)
+                    # Mesma chave que o PortainerMonitor usa para o container (nome <-> ID)
+                    key = container_suppressor.resolve_key(
+                        host_key, labels=labels,
+                        container_id=(portainer_result or {}).get('container_id'),
+                    )
                     
-                    # Resolver endpoint_id para verificação blue/green
-                    endpoint_id = None
-                    if portainer_client.enabled and portainer_result:
-                        host_for_endpoint = real_ip if real_ip and real_ip != 'unknown' else clean_host
-                        if host_for_endpoint and host_for_endpoint != 'unknown':
-                            endpoint_id = portainer_client.resolve_endpoint(host_for_endpoint)
+                    # endpoint_id e sibling blue/green já vêm da verificação paralela
+                    endpoint_id = portainer_lookup.get('endpoint_id')
                     
                     should_send, reason = container_suppressor.should_send(
                         key, current_state, 
                         container_name=container_name,
                         portainer_client=portainer_client if portainer_client.enabled else None,
-                        endpoint_id=endpoint_id
+                        endpoint_id=endpoint_id,
+                        sibling_status=portainer_lookup.get('sibling_status')
                     )
                     if DEBUG_MODE:
                         print(f"[DEBUG] Container suppression check: key={key} state={current_state} send={should_send} reason={reason}")
@@ -238,6 +324,8 @@ def create_app():
                 except Exception as exc:
                     if DEBUG_MODE:
                         print(f"[DEBUG] Erro na supressão de container: {exc}")
+                finally:
+                    ALERT_STAGE_SECONDS.observe(time.perf_counter() - suppression_started, stage='suppression')
 
             elif alert_type == 'disk':
                 lines = [
@@ -424,9 +512,9 @@ def create_app():
             if alert_type == 'container':
                 cinfo = alert_data.get('enriched_data', {}).get('container_context', {})
                 cname = cinfo.get('container_name') or labels.get('container') or labels.get('container_name')
-                cname_norm = (cname or '').strip().lower()
-                always_notify = cname_norm in {n.strip().lower() for n in CONTAINER_ALWAYS_NOTIFY_ALLOWLIST}
+                always_notify = container_allowlist.is_always_notify(cname)
 
+            ALERT_STAGE_SECONDS.observe(time.perf_counter() - build_started, stage='build')
             processed_alerts.append({
                 "content": content,
                 "embed": embed,
@@ -435,28 +523,42 @@ def create_app():
                 "labels": labels,
                 "enriched": enriched_info,
                 "always_notify": always_notify,
+                "webhooks": discord_router.route(alert_type, severity_level, labels, status=alert_status),
             })
 
         for alert in processed_alerts:
+            # Throttle por host/tipo antes do dedupe: um alerta descartado aqui não pode
+            # ficar registrado no cooldown, senão nunca seria entregue
+            host = throttle_host(alert['labels'], alert['enriched'])
+            if not alert.get('always_notify', False):
+                if not alert_throttle.allow(host, alert['type']):
+                    continue
             # Dedupe/cooldown: evita reenvio do mesmo alerta por 60m (exceto always_notify)
             if ALERT_DEDUP_ENABLED and not alert.get('always_notify', False):
-                fp = build_alert_fingerprint(alert['type'], alert['labels'], alert['enriched'], alert_status=alert['status'])
-                if dedupe_cache.is_within_ttl(fp):
+                with ALERT_STAGE_SECONDS.time(stage='dedupe'):
+                    fp = build_alert_fingerprint(alert['type'], alert['labels'], alert['enriched'], alert_status=alert['status'])
+                    # checa e registra o envio numa única operação (requisições concorrentes)
+                    duplicate = dedupe_cache.check_and_touch(fp)
+                if duplicate:
+                    # Duplicata não conta para o throttle
+                    alert_throttle.refund(host, alert['type'])
                     if DEBUG_MODE:
                         print(f"[DEBUG] DEDUPE: suprimindo alerta duplicado dentro do cooldown: {fp}")
                     continue
-                # registra envio
-                dedupe_cache.touch(fp)
             payload_embeds = [alert["embed"]]
             if DEBUG_MODE:
                 print(f"[DEBUG] Sending {alert['type']} alert payload:")
                 print(f"[DEBUG] Content length: {len(alert['content'])}")
                 print(f"[DEBUG] Payload: {json.dumps({'content': alert['content'], 'embeds': payload_embeds}, indent=2)[:500]}...")
 
-            resp = send_discord_payload(content=alert["content"], embeds=payload_embeds)
+            # Fan-out para os webhooks da tabela de roteamento (fila ou envio paralelo)
+            with ALERT_STAGE_SECONDS.time(stage='delivery'):
+                delivered = deliver(content=alert["content"], embeds=payload_embeds, webhooks=alert["webhooks"])
             if DEBUG_MODE:
-                print(f"[DEBUG] Sent {alert['type']} alert, status: {resp.status_code}")
+                print(f"[DEBUG] Delivered {alert['type']} alert to {len(alert['webhooks'])} webhook(s) (ok={delivered})")
 
+        if delivery_queue.running:
+            return '', 202
         return '', 200
 
     def handle_legacy_alert(data):
@@ -477,8 +579,7 @@ def create_app():
         if gif_url:
             payload_embeds.append({"image": {"url": gif_url}})
 
-        resp = send_discord_payload(content=f"🚨 **{title}**\n{message}{metric_info}", embeds=payload_embeds)
-        return '', resp.status_code
+        return '', send_direct(content=f"🚨 **{title}**\n{message}{metric_info}", embeds=payload_embeds)
 
     # --- Minimal templates parsing/formatting (migrated sem alterações de comportamento) ---
     import re
@@ -1,34 +1,222 @@
+import atexit
+import hashlib
+import logging
+import threading
 import time
-from typing import Dict, Optional
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from .constants import ALERT_DEDUP_BACKEND, ALERT_DEDUP_COMPACT
+from .metrics import DEDUPE_CHECKS
+
+logger = logging.getLogger(__name__)
 
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int, max_size: int = 5000):
+    """
+    Cache de cooldown por chave; compartilhado entre threads do servidor e o PortainerMonitor.
+
+    As chaves ficam num OrderedDict em ordem de último touch (move_to_end), que é também
+    a ordem de expiração, já que o TTL é único. Assim a limpeza só olha o início da fila
+    e para no primeiro item válido: touch e consulta são O(1) amortizado, sem varrer
+    nem ordenar o cache inteiro. Expirados fora do início são removidos na consulta.
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int = 5000, name: str = 'alerts'):
         self.ttl = ttl_seconds
         self.max_size = max_size
-        self._store: Dict[str, float] = {}
-
-    def _evict_if_needed(self):
-        # Remove expirados e controla tamanho
-        now = time.time()
-        expired_keys = [k for k, ts in self._store.items() if (now - ts) > self.ttl]
-        for k in expired_keys:
-            self._store.pop(k, None)
-        # Se ainda acima do limite, evict por ordem de idade (aprox.)
-        if len(self._store) > self.max_size:
-            # Ordena por timestamp (mais antigo primeiro)
-            for k in sorted(self._store, key=self._store.get)[: (len(self._store) - self.max_size)]:
-                self._store.pop(k, None)
+        self.name = name
+        self._store: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _evict_if_needed(self, now: float):
+        # Remove expirados do início (mais antigos) e controla tamanho
+        store = self._store
+        while store:
+            key, ts = next(iter(store.items()))
+            if (now - ts) <= self.ttl and len(store) <= self.max_size:
+                break
+            store.popitem(last=False)
+
+    def _set_locked(self, key: str, now: float):
+        self._store[key] = now
+        self._store.move_to_end(key)
+        self._evict_if_needed(now)
+
+    def _get_locked(self, key: str, now: float) -> Optional[float]:
+        ts = self._store.get(key)
+        if ts is not None and (now - ts) > self.ttl:
+            # expiração preguiçosa
+            del self._store[key]
+            return None
+        return ts
 
     def touch(self, key: str):
-        self._store[key] = time.time()
-        self._evict_if_needed()
+        with self._lock:
+            self._set_locked(key, time.time())
+
+    def _check(self, key: str, touch: bool) -> bool:
+        """Consulta a chave e, se touch=True e ela não estiver no cooldown, registra o envio."""
+        with self._lock:
+            now = time.time()
+            hit = self._get_locked(key, now) is not None
+            if touch and not hit:
+                self._set_locked(key, now)
+        return hit
 
     def is_within_ttl(self, key: str) -> bool:
-        ts = self._store.get(key)
-        if ts is None:
-            return False
-        return (time.time() - ts) <= self.ttl
+        hit = self._check(key, touch=False)
+        DEDUPE_CHECKS.inc(cache=self.name, result='hit' if hit else 'miss')
+        return hit
+
+    def check_and_touch(self, key: str) -> bool:
+        """
+        Versão atômica de is_within_ttl + touch: retorna True se a chave ainda está no
+        cooldown; caso contrário registra o envio. Evita que duas requisições
+        simultâneas com o mesmo alerta passem ambas pelo dedupe.
+        """
+        hit = self._check(key, touch=True)
+        DEDUPE_CHECKS.inc(cache=self.name, result='hit' if hit else 'miss')
+        return hit
+
+    def close(self):
+        """Nada a liberar em memória; backends persistentes gravam o que falta."""
+
+
+class CompactTTLCache(TTLCache):
+    """
+    Variante compacta do TTLCache para muitos fingerprints (ALERT_DEDUP_COMPACT=true).
+
+    Cada chave vira um digest de 64 bits (blake2b) guardado numa tabela de endereçamento
+    aberto (sondagem linear) sobre dois arrays: array('Q') com os digests e array('I')
+    com o instante do touch em décimos de segundo desde a criação do cache. São ~12
+    bytes por posição, contra centenas de bytes de uma string + float + entrada de dict.
+
+    - Remoção sem lápides (backward shift), então a sondagem continua curta.
+    - Expiração preguiçosa na consulta; ao crescer a tabela ou atingir max_size ela é
+      reconstruída sem os expirados e, se preciso, sem o 1/8 mais antigo (custo
+      amortizado constante por inserção).
+    - Colisão de digests é tratada como a mesma chave (probabilidade desprezível).
+    """
+
+    _EMPTY = 0
+    _TICKS_PER_SECOND = 10
+    _MAX_LOAD = 0.7
+
+    def __init__(self, ttl_seconds: int, max_size: int = 5000, name: str = 'alerts'):
+        super().__init__(ttl_seconds, max_size=max_size, name=name)
+        self._base = time.time()
+        self._ttl_ticks = int(ttl_seconds * self._TICKS_PER_SECOND)
+        self._count = 0
+        self._alloc(16)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _alloc(self, capacity: int):
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._keys = array('Q', bytes(8 * capacity))
+        self._stamps = array('I', bytes(4 * capacity))
+
+    @staticmethod
+    def _digest(key: str) -> int:
+        value = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        return value or 1  # 0 marca posição vazia
+
+    def _ticks(self, now: float) -> int:
+        return max(0, int((now - self._base) * self._TICKS_PER_SECOND))
+
+    def _find(self, digest: int) -> int:
+        """Posição do digest, ou a posição vazia onde ele entraria."""
+        keys, mask = self._keys, self._mask
+        i = digest & mask
+        while True:
+            k = keys[i]
+            if k == digest or k == self._EMPTY:
+                return i
+            i = (i + 1) & mask
+
+    def _delete_slot(self, i: int):
+        keys, stamps, mask = self._keys, self._stamps, self._mask
+        j = i
+        while True:
+            j = (j + 1) & mask
+            k = keys[j]
+            if k == self._EMPTY:
+                break
+            home = k & mask
+            # Mantém o item se sua posição de origem está no intervalo cíclico (i, j]
+            if (i < home <= j) if i <= j else (home > i or home <= j):
+                continue
+            keys[i] = k
+            stamps[i] = stamps[j]
+            i = j
+        keys[i] = self._EMPTY
+        stamps[i] = 0
+        self._count -= 1
+
+    def _rebuild(self, now_ticks: int, trim: bool):
+        live = [(k, ts) for k, ts in zip(self._keys, self._stamps)
+                if k != self._EMPTY and (now_ticks - ts) <= self._ttl_ticks]
+        if trim and len(live) >= self.max_size:
+            # Descarta o 1/8 mais antigo de uma vez (amortiza a ordenação)
+            live.sort(key=lambda item: item[1])
+            live = live[len(live) - max(0, self.max_size - max(1, self.max_size // 8)):]
+        capacity = 16
+        while capacity * self._MAX_LOAD <= len(live) + 1 or capacity * self._MAX_LOAD <= min(self.max_size, 2 * len(live) + 16):
+            capacity *= 2
+        self._alloc(capacity)
+        self._count = 0
+        for k, ts in live:
+            i = self._find(k)
+            self._keys[i] = k
+            self._stamps[i] = ts
+            self._count += 1
+
+    def _get_locked(self, key: str, now: float) -> Optional[float]:
+        i = self._find(self._digest(key))
+        if self._keys[i] == self._EMPTY:
+            return None
+        ts = self._stamps[i]
+        if (self._ticks(now) - ts) > self._ttl_ticks:
+            self._delete_slot(i)
+            return None
+        return self._base + ts / self._TICKS_PER_SECOND
+
+    def _set_locked(self, key: str, now: float):
+        digest = self._digest(key)
+        now_ticks = self._ticks(now)
+        i = self._find(digest)
+        if self._keys[i] == self._EMPTY:
+            if self._count >= self.max_size or (self._count + 1) > self._capacity * self._MAX_LOAD:
+                self._rebuild(now_ticks, trim=self._count >= self.max_size)
+                i = self._find(digest)
+            self._keys[i] = digest
+            self._count += 1
+        self._stamps[i] = now_ticks
+
+
+def build_dedupe_cache(ttl_seconds: int, max_size: int = 5000, name: str = 'alerts',
+                       backend: str = ALERT_DEDUP_BACKEND, compact: bool = ALERT_DEDUP_COMPACT) -> TTLCache:
+    """
+    Cria o cache de dedupe conforme ALERT_DEDUP_BACKEND ('memory' ou 'sqlite');
+    com ALERT_DEDUP_COMPACT=true o backend em memória usa CompactTTLCache.
+    """
+    if backend == 'sqlite':
+        from .dedupe_sqlite import SQLiteTTLCache
+        cache = SQLiteTTLCache(ttl_seconds, max_size=max_size, name=name)
+        atexit.register(cache.close)
+        return cache
+    if backend != 'memory':
+        logger.warning(f"ALERT_DEDUP_BACKEND desconhecido '{backend}', usando memória")
+    if compact:
+        return CompactTTLCache(ttl_seconds, max_size=max_size, name=name)
+    return TTLCache(ttl_seconds, max_size=max_size, name=name)
 
 
 def build_alert_fingerprint(alert_type: str, labels: dict, enriched_info: dict, alert_status: str | None = None) -> str:
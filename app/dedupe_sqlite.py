@@ -0,0 +1,180 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from .constants import (
+    DEBUG_MODE,
+    ALERT_DEDUP_DB_FILE,
+    ALERT_DEDUP_FLUSH_INTERVAL_MS,
+)
+from .dedupe import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteTTLCache(TTLCache):
+    """
+    TTLCache com os fingerprints também gravados num SQLite local (modo WAL), que pode
+    ser compartilhado por vários processos/réplicas no mesmo host e sobrevive a restarts.
+
+    - Leitura: o cache em memória responde primeiro; num miss consulta a tabela pela
+      chave primária (read-through), fora do lock do cache, e traz o resultado para a
+      memória quando isso não quebra a ordem de expiração do OrderedDict.
+    - Escrita: touch() atualiza a memória e enfileira a chave; uma thread grava em lote
+      (uma transação) a cada ALERT_DEDUP_FLUSH_INTERVAL_MS e remove os expirados.
+    - Entre réplicas o dedupe é de melhor esforço: um touch fica visível para os outros
+      processos após o próximo flush. Um lote que falhar volta para a fila de gravação.
+    Se o banco não puder ser aberto, segue apenas em memória (com aviso no log).
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int = 5000, name: str = 'alerts',
+                 db_path: str = ALERT_DEDUP_DB_FILE, flush_interval_ms: int = ALERT_DEDUP_FLUSH_INTERVAL_MS):
+        super().__init__(ttl_seconds, max_size=max_size, name=name)
+        self.db_path = db_path
+        self.flush_interval = max(10, flush_interval_ms) / 1000.0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._open()
+
+    def _open(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS dedupe (cache TEXT NOT NULL, key TEXT NOT NULL, ts REAL NOT NULL, PRIMARY KEY (cache, key))")
+            db.execute("CREATE INDEX IF NOT EXISTS dedupe_ts ON dedupe (ts)")
+        except Exception as exc:
+            logger.warning(f"Dedupe SQLite indisponível ({self.db_path}), usando apenas memória: {exc}")
+            return
+        self._db = db
+        self._flusher = threading.Thread(target=self._flush_loop, name=f"dedupe-sqlite-{self.name}", daemon=True)
+        self._flusher.start()
+        if DEBUG_MODE:
+            print(f"[DEBUG] Dedupe SQLite aberto: {self.db_path} (cache={self.name})")
+
+    # ---- hooks do TTLCache (chamados com self._lock) ----
+
+    def _get_locked(self, key: str, now: float) -> Optional[float]:
+        ts = super()._get_locked(key, now)
+        if ts is not None or self._db is None:
+            return ts
+        # Touch ainda não gravado, mas já removido da memória pelo max_size
+        ts = self._pending.get(key)
+        if ts is None or (now - ts) > self.ttl:
+            return None
+        return ts
+
+    def _remember_locked(self, key: str, ts: float, now: float):
+        """Traz para a memória um ts lido do banco, só se ele mantém a ordem de expiração."""
+        store = self._store
+        if store and next(reversed(store.values())) > ts:
+            # Mais antigo que o último da fila: no fim do OrderedDict quebraria a limpeza
+            # pelo início; fica só no banco e a próxima consulta volta a ele
+            return
+        store[key] = ts
+        self._evict_if_needed(now)
+
+    def _load(self, key: str) -> Optional[float]:
+        db = self._db
+        if db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = db.execute("SELECT ts FROM dedupe WHERE cache = ? AND key = ?", (self.name, key)).fetchone()
+        except Exception as exc:
+            logger.warning(f"Falha ao consultar dedupe SQLite: {exc}")
+            return None
+        return row[0] if row else None
+
+    def _check(self, key: str, touch: bool) -> bool:
+        with self._lock:
+            now = time.time()
+            hit = self._get_locked(key, now) is not None
+            if hit or self._db is None:
+                if touch and not hit:
+                    self._set_locked(key, now)
+                return hit
+        # Miss em memória: consulta o banco sem segurar o lock do cache
+        stored = self._load(key)
+        with self._lock:
+            now = time.time()
+            # Outra thread pode ter registrado a chave durante a consulta
+            hit = self._get_locked(key, now) is not None
+            if not hit and stored is not None and (now - stored) <= self.ttl:
+                hit = True
+                self._remember_locked(key, stored, now)
+            if touch and not hit:
+                self._set_locked(key, now)
+        return hit
+
+    def _set_locked(self, key: str, now: float):
+        super()._set_locked(key, now)
+        if self._db is not None:
+            self._pending[key] = now
+
+    # ---- gravação em lote ----
+
+    def flush(self):
+        with self._lock:
+            if not self._pending or self._db is None:
+                return
+            batch = [(self.name, key, ts) for key, ts in self._pending.items()]
+            self._pending = {}
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                # MAX: outra réplica pode ter gravado um touch mais recente
+                self._db.executemany(
+                    "INSERT INTO dedupe (cache, key, ts) VALUES (?, ?, ?) "
+                    "ON CONFLICT (cache, key) DO UPDATE SET ts = MAX(ts, excluded.ts)",
+                    batch,
+                )
+                self._db.execute("COMMIT")
+        except Exception as exc:
+            logger.warning(f"Falha ao gravar lote no dedupe SQLite ({len(batch)} chaves): {exc}")
+            try:
+                with self._db_lock:
+                    self._db.execute("ROLLBACK")
+            except Exception:
+                pass
+            # Devolve o lote para a próxima tentativa (touches mais novos prevalecem)
+            with self._lock:
+                for _, key, ts in batch:
+                    if self._pending.get(key, 0) < ts:
+                        self._pending[key] = ts
+
+    def _purge_expired(self):
+        try:
+            with self._db_lock:
+                self._db.execute("DELETE FROM dedupe WHERE cache = ? AND ts < ?", (self.name, time.time() - self.ttl))
+        except Exception as exc:
+            logger.warning(f"Falha ao remover expirados do dedupe SQLite: {exc}")
+
+    def _flush_loop(self):
+        last_purge = time.monotonic()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() - last_purge >= 60:
+                self._purge_expired()
+                last_purge = time.monotonic()
+
+    def close(self):
+        self._stop.set()
+        if self._db is None:
+            return
+        self.flush()
+        with self._db_lock:
+            try:
+                self._db.close()
+            except Exception as exc:
+                logger.warning(f"Falha ao fechar dedupe SQLite: {exc}")
+            self._db = None
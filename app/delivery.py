@@ -0,0 +1,451 @@
+import atexit
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from .constants import (
+    DEBUG_MODE,
+    DISCORD_WEBHOOK_URL,
+    DELIVERY_ASYNC_ENABLED,
+    DELIVERY_QUEUE_MAX,
+    DELIVERY_WORKERS,
+    DELIVERY_DRAIN_TIMEOUT_SECONDS,
+    DELIVERY_RETRY_BUFFER_MAX,
+    DELIVERY_RETRY_BASE_SECONDS,
+    DELIVERY_RETRY_MAX_SECONDS,
+    DISCORD_COALESCE_ENABLED,
+    DISCORD_COALESCE_WINDOW_MS,
+    DISCORD_COALESCE_MAX_ITEMS,
+    DISCORD_OUTBOX_REPLAY_SECONDS,
+)
+from .batching import pack_messages
+from .circuit import CircuitOpenError, backoff_with_jitter, discord_breakers
+from .metrics import metrics_registry
+from .outbox import discord_outbox
+from .routing import mask_webhook
+from .services import send_discord_payload
+
+
+class _Lane:
+    """Fila e workers de um único webhook (um canal lento não atrasa os demais)."""
+
+    __slots__ = ('webhook_url', 'queue', 'threads', 'retry', 'retry_at', 'retry_attempts')
+
+    def __init__(self, webhook_url: str, max_size: int):
+        self.webhook_url = webhook_url
+        self.queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_size)
+        self.threads: List[threading.Thread] = []
+        # Buffer local de reenvio (falhas/circuito aberto); protegido pelo lock da DeliveryQueue
+        self.retry: "collections.deque[Dict]" = collections.deque()
+        self.retry_at = 0.0
+        self.retry_attempts = 0
+
+
+class DeliveryQueue:
+    """
+    Fila em memória (limitada) para envio assíncrono ao Discord.
+    O handler HTTP apenas enfileira e responde; um pool de workers faz o envio.
+    Quando a fila está cheia o alerta é descartado e contabilizado em 'dropped'.
+
+    Cada webhook de destino tem sua própria fila e seus próprios workers (lane),
+    criados sob demanda: o fan-out para vários canais acontece em paralelo.
+
+    Com coalescing habilitado, cada worker aguarda uma janela curta após o primeiro
+    item e agrupa os alertas recebidos nesse intervalo (webhooks próximos e emissões
+    do PortainerMonitor) em mensagens com vários embeds (ver batching.pack_messages).
+
+    Se o outbox estiver aberto, cada alerta é gravado em disco antes de entrar na
+    fila e marcado como entregue após um 2xx; o que não foi entregue por restart é
+    reenviado no próximo startup. O que foi descartado em runtime (fila cheia, buffer
+    de reenvio lotado) fica estacionado no outbox e volta à fila a cada
+    DISCORD_OUTBOX_REPLAY_SECONDS.
+
+    Falhas transitórias (rede, 5xx, 429 esgotado, circuito aberto) vão para um
+    buffer local por webhook e são reenviadas com backoff exponencial + jitter;
+    enquanto o circuito está aberto os envios caem direto nesse buffer.
+    """
+
+    def __init__(self, max_size: int = DELIVERY_QUEUE_MAX, workers: int = DELIVERY_WORKERS,
+                 coalesce: bool = DISCORD_COALESCE_ENABLED, coalesce_window_ms: int = DISCORD_COALESCE_WINDOW_MS,
+                 coalesce_max_items: int = DISCORD_COALESCE_MAX_ITEMS,
+                 replay_seconds: float = DISCORD_OUTBOX_REPLAY_SECONDS):
+        self.max_size = max(1, max_size)
+        self.workers = max(1, workers)
+        self.coalesce = coalesce
+        self.coalesce_window = max(0, coalesce_window_ms) / 1000.0
+        self.coalesce_max_items = max(1, coalesce_max_items)
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._accepting = False
+        self.replay_interval = max(1.0, replay_seconds)
+        self._replay_stop = threading.Event()
+        self._replayer: Optional[threading.Thread] = None
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'sent': 0,
+            'failed': 0,
+            'messages': 0,
+            'retried': 0,
+            'buffer_dropped': 0,
+            'outbox_replayed': 0,
+            'enqueue_latency_total_ms': 0.0,
+            'enqueue_latency_max_ms': 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def start(self):
+        with self._lock:
+            self._accepting = True
+        if discord_outbox.is_open and self._replayer is None:
+            self._replay_stop.clear()
+            self._replayer = threading.Thread(target=self._replay_loop, name="discord-outbox-replay", daemon=True)
+            self._replayer.start()
+        if DEBUG_MODE:
+            print(f"[DEBUG] DeliveryQueue iniciada (workers por webhook={self.workers}, max={self.max_size})")
+
+    def _lane_locked(self, webhook_url: str) -> _Lane:
+        lane = self._lanes.get(webhook_url)
+        if lane is None:
+            lane = _Lane(webhook_url, self.max_size)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, args=(lane,), name=f"discord-delivery-{len(self._lanes)}-{i}", daemon=True)
+                t.start()
+                lane.threads.append(t)
+            self._lanes[webhook_url] = lane
+        return lane
+
+    def enqueue(self, content=None, embeds=None, webhook_url: Optional[str] = None,
+                outbox_id: Optional[str] = None) -> bool:
+        """Enfileira uma mensagem; retorna False se descartada (fila cheia/parada)."""
+        started = time.perf_counter()
+        webhook_url = webhook_url or DISCORD_WEBHOOK_URL
+        if outbox_id is None and self._accepting:
+            outbox_id = discord_outbox.put(content=content, embeds=embeds, webhook_url=webhook_url)
+        item = {'content': content, 'embeds': embeds, 'enqueued_at': time.time(), 'outbox_id': outbox_id}
+        accepted = False
+        with self._lock:
+            if self._accepting:
+                try:
+                    self._lane_locked(webhook_url).queue.put_nowait(item)
+                    self._pending += 1
+                    accepted = True
+                except queue.Full:
+                    pass
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            if accepted:
+                self._stats['enqueued'] += 1
+                self._stats['enqueue_latency_total_ms'] += elapsed_ms
+                self._stats['enqueue_latency_max_ms'] = max(self._stats['enqueue_latency_max_ms'], elapsed_ms)
+            else:
+                self._stats['dropped'] += 1
+        if not accepted:
+            # Segue pendente no outbox; _replay_parked tenta de novo mais tarde
+            discord_outbox.park([outbox_id])
+            if DEBUG_MODE:
+                print(f"[DEBUG] DeliveryQueue: mensagem descartada para {mask_webhook(webhook_url)} (fila cheia ou parada)")
+        return accepted
+
+    def _replay_parked(self) -> int:
+        """Reenfileira os pendentes do outbox descartados em runtime; retorna quantos entraram."""
+        entries = discord_outbox.take_parked(self.max_size)
+        replayed = 0
+        for entry in entries:
+            if self.enqueue(content=entry.get('content'), embeds=entry.get('embeds'),
+                            webhook_url=entry.get('webhook_url'), outbox_id=entry['id']):
+                replayed += 1
+        if replayed:
+            with self._lock:
+                self._stats['outbox_replayed'] += replayed
+        if entries and DEBUG_MODE:
+            print(f"[DEBUG] DeliveryQueue: {replayed}/{len(entries)} pendentes do outbox reenfileirados")
+        return replayed
+
+    def _replay_loop(self):
+        while not self._replay_stop.wait(self.replay_interval):
+            try:
+                self._replay_parked()
+            except Exception as exc:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] DeliveryQueue: falha ao reenfileirar pendentes do outbox: {exc}")
+
+    def _collect(self, lane: _Lane, first: Dict):
+        """Junta ao primeiro item os que chegarem dentro da janela de coalescing."""
+        batch = [first]
+        stop = False
+        if not self.coalesce:
+            return batch, stop
+        deadline = time.monotonic() + self.coalesce_window
+        while len(batch) < self.coalesce_max_items:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = lane.queue.get(timeout=remaining)
+                else:
+                    item = lane.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _buffer_locked(self, lane: _Lane, items: List[Dict], front: bool = False) -> int:
+        """
+        Coloca itens no buffer de reenvio do lane, sem mexer no backoff; retorna quantos
+        foram descartados. front=True devolve ao início os itens que saíram do buffer.
+        """
+        space = max(0, DELIVERY_RETRY_BUFFER_MAX - len(lane.retry))
+        kept = items[:space]
+        # Descartados seguem pendentes no outbox e voltam pela _replay_parked
+        discord_outbox.park(i.get('outbox_id') for i in items[space:])
+        if front:
+            lane.retry.extendleft(reversed(kept))
+        else:
+            lane.retry.extend(kept)
+        overflow = len(items) - len(kept)
+        self._stats['buffer_dropped'] += overflow
+        return overflow
+
+    def _backoff_locked(self, lane: _Lane, retry_in: float = 0.0):
+        """Adia a próxima tentativa do lane após um envio que falhou."""
+        delay = max(retry_in, backoff_with_jitter(lane.retry_attempts, DELIVERY_RETRY_BASE_SECONDS, DELIVERY_RETRY_MAX_SECONDS))
+        lane.retry_attempts += 1
+        lane.retry_at = time.monotonic() + delay
+        if DEBUG_MODE:
+            print(f"[DEBUG] DeliveryQueue: {len(lane.retry)} alertas para {mask_webhook(lane.webhook_url)} no buffer de reenvio (próxima tentativa em {delay:.2f}s)")
+
+    def _send_batch(self, lane: _Lane, batch: List[Dict], from_retry: bool = False):
+        sent = messages = rejected = 0
+        to_retry: List[Dict] = []
+        retry_in = 0.0
+        for message in pack_messages(batch):
+            items = message['items']
+            messages += 1
+            try:
+                resp = send_discord_payload(content=message['content'], embeds=message['embeds'], webhook_url=lane.webhook_url)
+            except CircuitOpenError as exc:
+                to_retry.extend(items)
+                retry_in = max(retry_in, exc.retry_in)
+                continue
+            except Exception as exc:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] DeliveryQueue: falha no envio para {mask_webhook(lane.webhook_url)}: {exc}")
+                to_retry.extend(items)
+                continue
+            if DEBUG_MODE:
+                waited = time.time() - items[0]['enqueued_at']
+                print(f"[DEBUG] DeliveryQueue: enviado para {mask_webhook(lane.webhook_url)} status={resp.status_code} alertas={len(items)} (aguardou {waited:.3f}s na fila)")
+            if 200 <= resp.status_code < 300:
+                sent += len(items)
+                discord_outbox.done(i.get('outbox_id') for i in items)
+            elif resp.status_code == 429 or resp.status_code >= 500:
+                to_retry.extend(items)
+            else:
+                # 4xx: payload rejeitado pelo Discord, reenviar não adianta
+                rejected += len(items)
+                discord_outbox.done(i.get('outbox_id') for i in items)
+
+        with self._lock:
+            overflow = 0
+            if to_retry:
+                overflow = self._buffer_locked(lane, to_retry, front=from_retry)
+                self._backoff_locked(lane, retry_in)
+            elif sent:
+                lane.retry_attempts = 0
+            self._stats['sent'] += sent
+            self._stats['failed'] += rejected + overflow
+            self._stats['messages'] += messages
+            self._pending -= sent + rejected + overflow
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def _worker(self, lane: _Lane):
+        while True:
+            batch: List[Dict] = []
+            with self._lock:
+                now = time.monotonic()
+                if lane.retry and now >= lane.retry_at:
+                    while lane.retry and len(batch) < self.coalesce_max_items:
+                        batch.append(lane.retry.popleft())
+                    self._stats['retried'] += len(batch)
+                timeout = max(0.05, lane.retry_at - now) if (lane.retry and not batch) else None
+            if batch:
+                self._send_batch(lane, batch, from_retry=True)
+                continue
+
+            try:
+                first = lane.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+            batch, stop = self._collect(lane, first)
+            with self._lock:
+                if lane.retry:
+                    # Ainda em backoff: preserva a ordem e não insiste no webhook. Só
+                    # entra no buffer; o prazo da próxima tentativa não muda, senão
+                    # tráfego contínuo adiaria o reenvio indefinidamente
+                    overflow = self._buffer_locked(lane, batch)
+                    self._stats['failed'] += overflow
+                    self._pending -= overflow
+                    batch = []
+            if batch:
+                self._send_batch(lane, batch)
+            if stop:
+                break
+
+    def stats(self) -> Dict:
+        with self._lock:
+            enqueued = self._stats['enqueued']
+            avg_ms = (self._stats['enqueue_latency_total_ms'] / enqueued) if enqueued else 0.0
+            lanes = {mask_webhook(url): lane.queue.qsize() for url, lane in self._lanes.items()}
+            return {
+                'running': self._accepting,
+                'workers': sum(len(lane.threads) for lane in self._lanes.values()),
+                'depth': sum(lanes.values()),
+                'lanes': lanes,
+                'max_size': self.max_size,
+                'pending': self._pending,
+                'enqueued': enqueued,
+                'dropped': self._stats['dropped'],
+                'sent': self._stats['sent'],
+                'failed': self._stats['failed'],
+                'messages': self._stats['messages'],
+                'retry_buffer': sum(len(lane.retry) for lane in self._lanes.values()),
+                'retried': self._stats['retried'],
+                'buffer_dropped': self._stats['buffer_dropped'],
+                'outbox_pending': discord_outbox.pending_count() if discord_outbox.is_open else None,
+                'outbox_parked': discord_outbox.parked_count() if discord_outbox.is_open else None,
+                'outbox_replayed': self._stats['outbox_replayed'],
+                'enqueue_latency_avg_ms': round(avg_ms, 3),
+                'enqueue_latency_max_ms': round(self._stats['enqueue_latency_max_ms'], 3),
+            }
+
+    def drain(self, timeout: float = DELIVERY_DRAIN_TIMEOUT_SECONDS) -> bool:
+        """Para de aceitar mensagens e aguarda o envio das pendentes (até timeout)."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        self._replay_stop.set()
+        self._replayer = None
+        with self._lock:
+            self._accepting = False
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            drained = self._pending <= 0
+            left = self._pending
+            lanes = list(self._lanes.values())
+            self._lanes = {}
+        for lane in lanes:
+            for _ in lane.threads:
+                try:
+                    lane.queue.put_nowait(None)
+                except queue.Full:
+                    break
+        if DEBUG_MODE:
+            print(f"[DEBUG] DeliveryQueue drenada (ok={drained}, pendentes={left})")
+        return drained
+
+
+delivery_queue = DeliveryQueue()
+
+_CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def _queue_gauge() -> Dict:
+    stats = delivery_queue.stats()
+    fields = ('depth', 'pending', 'retry_buffer', 'outbox_pending', 'outbox_parked')
+    return {(field,): stats[field] for field in fields if stats[field] is not None}
+
+
+metrics_registry.gauge('delivery_queue_messages', 'Mensagens na fila de entrega por estado', _queue_gauge, ('state',))
+metrics_registry.gauge('delivery_dropped_total', 'Mensagens descartadas com a fila cheia ou parada',
+                       lambda: delivery_queue.stats()['dropped'], kind='counter')
+metrics_registry.gauge('discord_circuit_state', 'Estado do circuit breaker por webhook (0=closed, 1=half_open, 2=open)',
+                       lambda: {(mask_webhook(url),): _CIRCUIT_STATE_VALUES.get(b.state, 0) for url, b in discord_breakers.items()},
+                       ('webhook',))
+
+
+def circuit_snapshot() -> Dict[str, Dict]:
+    """Estado dos circuit breakers por webhook (sem expor o token)."""
+    return {mask_webhook(url): breaker.snapshot() for url, breaker in discord_breakers.items()}
+
+
+# Fan-out síncrono (fila desabilitada): um envio por webhook, em paralelo
+_fanout_executor = ThreadPoolExecutor(max_workers=max(1, DELIVERY_WORKERS) * 2, thread_name_prefix="discord-fanout")
+
+
+def _send_ok(content, embeds, webhook_url) -> bool:
+    try:
+        resp = send_discord_payload(content=content, embeds=embeds, webhook_url=webhook_url)
+        return 200 <= resp.status_code < 300
+    except Exception as exc:
+        if DEBUG_MODE:
+            print(f"[DEBUG] Falha no envio para {mask_webhook(webhook_url)}: {exc}")
+        return False
+
+
+def deliver(content=None, embeds=None, webhooks: Optional[Iterable[str]] = None) -> bool:
+    """
+    Entrega a mensagem a cada webhook de destino (default: DISCORD_WEBHOOK_URL).
+    Enfileira na DeliveryQueue se ativa; caso contrário envia de forma síncrona,
+    em paralelo entre os destinos. Retorna True se todos aceitaram.
+    """
+    targets = list(webhooks) if webhooks else [DISCORD_WEBHOOK_URL]
+    if delivery_queue.running:
+        results = [delivery_queue.enqueue(content=content, embeds=embeds, webhook_url=url) for url in targets]
+        return all(results)
+    if len(targets) == 1:
+        return _send_ok(content, embeds, targets[0])
+    futures = [_fanout_executor.submit(_send_ok, content, embeds, url) for url in targets]
+    return all(f.result() for f in futures)
+
+
+def send_direct(content=None, embeds=None, webhook_url: Optional[str] = None) -> int:
+    """
+    Envio síncrono (rotas /alert_minimal e legado) que responde com o status do Discord.
+    Com o circuito aberto ou erro de rede a mensagem cai na DeliveryQueue (202),
+    que reenvia com backoff; sem fila ativa responde 503.
+    """
+    try:
+        return send_discord_payload(content=content, embeds=embeds, webhook_url=webhook_url).status_code
+    except (CircuitOpenError, requests.RequestException) as exc:
+        if DEBUG_MODE:
+            print(f"[DEBUG] Envio direto falhou ({exc}); usando a fila de entrega")
+        if delivery_queue.running and delivery_queue.enqueue(content=content, embeds=embeds, webhook_url=webhook_url):
+            return 202
+        return 503
+
+
+def start_delivery_queue() -> Optional[DeliveryQueue]:
+    if not DELIVERY_ASYNC_ENABLED:
+        if DEBUG_MODE:
+            print("[DEBUG] DeliveryQueue não iniciada (DELIVERY_ASYNC_ENABLED=false)")
+        return None
+    if not delivery_queue.running:
+        pending = discord_outbox.open()
+        delivery_queue.start()
+        atexit.register(_shutdown)
+        # Reenvia o que ficou pendente no outbox (restart / Discord indisponível)
+        for entry in pending:
+            delivery_queue.enqueue(content=entry.get('content'), embeds=entry.get('embeds'),
+                                   webhook_url=entry.get('webhook_url'), outbox_id=entry['id'])
+    return delivery_queue
+
+
+def _shutdown():
+    delivery_queue.drain()
+    discord_outbox.close()
@@ -0,0 +1,27 @@
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def build_pooled_session(pool_connections: int, pool_maxsize: int, max_retries=0,
+                         headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """
+    Cria uma requests.Session com pool de conexões keep-alive.
+
+    O pool do urllib3 é thread-safe: várias threads podem compartilhar a mesma
+    sessão, e com pool_block=True no máximo `pool_maxsize` conexões ficam abertas
+    por host (as demais requisições aguardam uma conexão livre).
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max(1, pool_connections),
+        pool_maxsize=max(1, pool_maxsize),
+        max_retries=max_retries,
+        pool_block=True,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
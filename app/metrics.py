@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Buckets (segundos) pensados para as etapas do pipeline: de microssegundos (parse)
+# até alguns segundos (Portainer/Discord com timeout)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = 'grafana_discord_proxy_'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = METRIC_PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        return []
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """Contador monotônico com labels (dict de tuplas -> valor, protegido por lock)."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """Histograma com buckets fixos; observe() custa um bisect e três somas sob lock."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # por label: [contagens por bucket (não cumulativas)..., soma, total]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            data[idx] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        lines = []
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(data[-1])}")
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """
+    Valor calculado na coleta: a função retorna um número ou {tupla de labels: valor}.
+    kind='counter' expõe contadores que já existem em outro lugar (ex.: stats da fila).
+    """
+
+    def __init__(self, name: str, help_text: str, func: Callable, labelnames: Sequence[str] = (), kind: str = 'gauge'):
+        super().__init__(name, help_text, labelnames)
+        self.func = func
+        self.kind = kind
+
+    def _samples(self) -> List[str]:
+        try:
+            result = self.func()
+        except Exception:
+            return []
+        if not isinstance(result, dict):
+            return [f"{self.name} {_format_value(result)}"]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in result.items()]
+
+
+class MetricsRegistry:
+    """Registro em memória das métricas do processo, exportadas no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, func: Callable, labelnames: Sequence[str] = (), kind: str = 'gauge') -> GaugeCallback:
+        return self.register(GaugeCallback(name, help_text, func, labelnames, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+# ---- Métricas do pipeline ----
+ALERT_STAGE_SECONDS = metrics_registry.histogram(
+    'alert_stage_seconds', 'Tempo gasto em cada etapa do processamento de /alert', ('stage',))
+ALERTS_RECEIVED = metrics_registry.counter(
+    'alerts_received_total', 'Alertas recebidos por tipo e status', ('alert_type', 'status'))
+DEDUPE_CHECKS = metrics_registry.counter(
+    'dedupe_checks_total', 'Consultas ao cache de dedupe (hit = suprimido pelo cooldown)', ('cache', 'result'))
+ALERTS_THROTTLED = metrics_registry.counter(
+    'alerts_throttled_total', 'Alertas descartados pelo throttle por host/tipo', ('alert_type',))
+SUPPRESSION_DECISIONS = metrics_registry.counter(
+    'suppression_decisions_total', 'Decisões do ContainerSuppressor por motivo', ('decision', 'reason'))
+PORTAINER_REQUESTS = metrics_registry.counter(
+    'portainer_requests_total', 'Chamadas à API do Portainer por rota e status', ('method', 'path', 'status'))
+PORTAINER_REQUEST_SECONDS = metrics_registry.histogram(
+    'portainer_request_seconds', 'Latência das chamadas à API do Portainer', ('method', 'path'))
+PORTAINER_MONITOR_POLL_SECONDS = metrics_registry.histogram(
+    'portainer_monitor_poll_seconds', 'Duração da consulta de containers de cada endpoint pelo PortainerMonitor', ('endpoint', 'result'))
+PORTAINER_MONITOR_MISSED_DEADLINES = metrics_registry.counter(
+    'portainer_monitor_missed_deadlines_total', 'Consultas do PortainerMonitor que passaram do prazo por endpoint', ('endpoint',))
+DISCORD_RESPONSES = metrics_registry.counter(
+    'discord_responses_total', 'Respostas do webhook do Discord por status HTTP', ('status',))
+DISCORD_REQUEST_SECONDS = metrics_registry.histogram(
+    'discord_request_seconds', 'Latência das requisições ao webhook do Discord')
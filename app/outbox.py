@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from .constants import (
+    DISCORD_OUTBOX_ENABLED,
+    DISCORD_OUTBOX_FILE,
+    DISCORD_OUTBOX_FSYNC_INTERVAL_MS,
+    DISCORD_OUTBOX_COMPACT_EVERY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Log append-only (JSON por linha) das mensagens ainda não entregues ao Discord.
+
+    - put(): grava o payload ANTES da entrega (registro 'put')
+    - done(): marca como entregue após um 2xx (registro 'done')
+    - open(): relê o log no startup e devolve os pendentes para reenvio
+    - fsync em lote a cada DISCORD_OUTBOX_FSYNC_INTERVAL_MS (thread de flush)
+    - compactação: reescreve o arquivo só com os pendentes (temp + rename)
+      depois de DISCORD_OUTBOX_COMPACT_EVERY entregas, mantendo o log pequeno
+    - park()/take_parked(): pendentes que a fila descartou em runtime ficam
+      estacionados até a DeliveryQueue reenfileirá-los (sem esperar um restart)
+    """
+
+    def __init__(self, path: str = DISCORD_OUTBOX_FILE, enabled: bool = DISCORD_OUTBOX_ENABLED,
+                 fsync_interval_ms: int = DISCORD_OUTBOX_FSYNC_INTERVAL_MS,
+                 compact_every: int = DISCORD_OUTBOX_COMPACT_EVERY):
+        self.path = path
+        self.enabled = bool(enabled and path)
+        self.fsync_interval = max(10, fsync_interval_ms) / 1000.0
+        self.compact_every = max(1, compact_every)
+        self._lock = threading.Lock()
+        self._fh = None
+        self._pending: Dict[str, Dict] = {}
+        # ids pendentes fora da fila (descartados), em ordem de chegada
+        self._parked: Dict[str, None] = {}
+        self._done_since_compact = 0
+        self._unsynced = False
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._fh is not None
+
+    def _read_log(self) -> Dict[str, Dict]:
+        pending: Dict[str, Dict] = {}
+        if not os.path.exists(self.path):
+            return pending
+        with open(self.path, 'r', encoding='utf-8') as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # última linha pode ter ficado truncada num crash
+                    continue
+                op = record.get('op')
+                rid = record.get('id')
+                if not rid:
+                    continue
+                if op == 'put':
+                    pending[rid] = {
+                        'content': record.get('content'),
+                        'embeds': record.get('embeds'),
+                        'webhook_url': record.get('webhook_url'),
+                        'ts': record.get('ts'),
+                    }
+                elif op == 'done':
+                    pending.pop(rid, None)
+        return pending
+
+    def open(self) -> List[Dict]:
+        """Abre o log e retorna as entradas pendentes (id, content, embeds, webhook_url) para replay."""
+        if not self.enabled or self.is_open:
+            return []
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                self._pending = self._read_log()
+                self._parked = {}
+                # Compacta no startup: o arquivo passa a conter só os pendentes
+                self._rewrite_locked()
+        except Exception as exc:
+            logger.warning(f"Outbox do Discord desabilitado ({self.path}): {exc}")
+            self.enabled = False
+            return []
+
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="discord-outbox-fsync", daemon=True)
+        self._flusher.start()
+        if self._pending:
+            logger.info(f"Outbox do Discord: {len(self._pending)} mensagens pendentes para reenvio")
+        return [dict(entry, id=rid) for rid, entry in self._pending.items()]
+
+    def _append_locked(self, record: Dict):
+        self._fh.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._fh.flush()
+        self._unsynced = True
+
+    def put(self, content=None, embeds=None, webhook_url: Optional[str] = None) -> Optional[str]:
+        if not self.is_open:
+            return None
+        rid = uuid.uuid4().hex
+        record = {'op': 'put', 'id': rid, 'ts': time.time(), 'content': content, 'embeds': embeds, 'webhook_url': webhook_url}
+        try:
+            with self._lock:
+                self._append_locked(record)
+                self._pending[rid] = {'content': content, 'embeds': embeds, 'webhook_url': webhook_url, 'ts': record['ts']}
+        except Exception as exc:
+            logger.warning(f"Falha ao gravar no outbox do Discord: {exc}")
+            return None
+        return rid
+
+    def done(self, ids: Iterable[Optional[str]]):
+        if not self.is_open:
+            return
+        try:
+            with self._lock:
+                for rid in ids:
+                    if rid:
+                        self._parked.pop(rid, None)
+                    if rid and self._pending.pop(rid, None) is not None:
+                        self._append_locked({'op': 'done', 'id': rid})
+                        self._done_since_compact += 1
+        except Exception as exc:
+            logger.warning(f"Falha ao marcar entrega no outbox do Discord: {exc}")
+
+    def park(self, ids: Iterable[Optional[str]]):
+        """Marca pendentes que saíram da fila sem entrega (descartados) para reenvio posterior."""
+        with self._lock:
+            for rid in ids:
+                if rid and rid in self._pending:
+                    self._parked[rid] = None
+
+    def take_parked(self, limit: int) -> List[Dict]:
+        """Retira até `limit` pendentes estacionados (mais antigos primeiro) para reenfileirar."""
+        entries: List[Dict] = []
+        with self._lock:
+            while self._parked and len(entries) < limit:
+                rid = next(iter(self._parked))
+                del self._parked[rid]
+                entry = self._pending.get(rid)
+                if entry is not None:
+                    entries.append(dict(entry, id=rid))
+        return entries
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def parked_count(self) -> int:
+        with self._lock:
+            return len(self._parked)
+
+    def _sync_locked(self):
+        if self._fh is not None and self._unsynced:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._unsynced = False
+
+    def _rewrite_locked(self):
+        """
+        Reescreve o log apenas com os pendentes (arquivo temporário + rename atômico).
+        O handle do temporário passa a ser o do log (o rename mantém o arquivo); se algo
+        falhar antes do rename, o handle atual segue aberto no log original.
+        """
+        tmp_path = f"{self.path}.tmp"
+        tmp = open(tmp_path, 'w', encoding='utf-8')
+        try:
+            for rid, entry in self._pending.items():
+                record = dict(entry, op='put', id=rid)
+                tmp.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            tmp.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        previous, self._fh = self._fh, tmp
+        self._done_since_compact = 0
+        self._unsynced = False
+        if previous is not None:
+            try:
+                previous.close()
+            except Exception as exc:
+                logger.warning(f"Falha ao fechar o log anterior do outbox do Discord: {exc}")
+
+    def compact(self):
+        if not self.is_open:
+            return
+        try:
+            with self._lock:
+                self._rewrite_locked()
+        except Exception as exc:
+            logger.warning(f"Falha ao compactar outbox do Discord: {exc}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                with self._lock:
+                    if self._done_since_compact >= self.compact_every:
+                        self._rewrite_locked()
+                    else:
+                        self._sync_locked()
+            except Exception as exc:
+                logger.warning(f"Falha no fsync do outbox do Discord: {exc}")
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._fh is None:
+                return
+            try:
+                if self._done_since_compact:
+                    self._rewrite_locked()
+                self._sync_locked()
+                self._fh.close()
+            except Exception as exc:
+                logger.warning(f"Falha ao fechar outbox do Discord: {exc}")
+            self._fh = None
+
+
+discord_outbox = Outbox()
@@ -1,11 +1,14 @@
 import json
 import os
+import re
+import threading
 import time
 from typing import Dict, Iterable, List, Optional, Any
 
 import requests
 import urllib3
 import warnings
+from urllib3.util.retry import Retry
 
 from .constants import (
     CONTAINER_VALIDATE_WITH_PORTAINER,
@@ -14,10 +17,22 @@ from .constants import (
     PORTAINER_ENDPOINT_MAP_FILE,
     PORTAINER_FAIL_OPEN,
     PORTAINER_STRICT_NAME_MATCH,
+    PORTAINER_SERVER_FILTERS,
     PORTAINER_TIMEOUT_SECONDS,
     PORTAINER_VERIFY_TLS,
+    PORTAINER_VERIFY_WORKERS,
+    PORTAINER_POOL_SIZE,
+    PORTAINER_MAX_RETRIES,
+    PORTAINER_RETRY_BACKOFF_SECONDS,
     DEBUG_MODE,
 )
+from .http_pool import build_pooled_session
+from .portainer_cache import ContainerListCache
+from .portainer_index import RUNNING_STATES, ContainerNameIndex
+from .metrics import PORTAINER_REQUESTS, PORTAINER_REQUEST_SECONDS
+
+# IDs numéricos (endpoint) e hashes de container viram placeholders no label 'path' das métricas
+_METRIC_PATH_RE = re.compile(r'/(?:\d+|[0-9a-f]{12,64})(?=/|$)')
 
 # Suprime globalmente avisos de HTTPS não verificado quando TLS estiver desativado para Portainer
 if not PORTAINER_VERIFY_TLS:
@@ -31,12 +46,6 @@ if not PORTAINER_VERIFY_TLS:
         pass
 
 
-def _normalize_name(name: Optional[str]) -> Optional[str]:
-    if not name:
-        return None
-    return name.strip().lstrip('/').lower()
-
-
 def _load_endpoint_map(file_path: Optional[str]) -> Dict[str, int]:
     mapping: Dict[str, int] = {}
     if not file_path:
@@ -115,6 +124,11 @@ def _load_endpoint_meta(file_path: Optional[str]) -> Dict[str, Dict[str, Any]]:
     return meta
 
 
+def _name_filter(names: Iterable[str]) -> str:
+    """Regex do filtro `name` do Docker casando exatamente um dos nomes (com ou sem '/')."""
+    return "(?i)^/?(?:" + "|".join(re.escape(n) for n in sorted(names)) + ")$"
+
+
 class PortainerClient:
     def __init__(self):
         self.enabled = (
@@ -128,6 +142,7 @@ class PortainerClient:
         self.verify_tls = PORTAINER_VERIFY_TLS
         self.fail_open = PORTAINER_FAIL_OPEN
         self.strict_name_match = PORTAINER_STRICT_NAME_MATCH
+        self.server_filters = PORTAINER_SERVER_FILTERS
         self.endpoint_map_path = PORTAINER_ENDPOINT_MAP_FILE
         self.endpoint_map = _load_endpoint_map(self.endpoint_map_path)
         self.endpoint_meta = _load_endpoint_meta(self.endpoint_map_path)
@@ -136,7 +151,16 @@ class PortainerClient:
         except Exception:
             self._map_mtime = 0.0
         self._endpoints_cache: Dict[int, Dict] = {}
+        self._endpoint_name_map: Dict[str, int] = {}
         self._last_refresh = 0.0
+        # Serializa refresh dos caches (requisições + PortainerMonitor); leitores usam
+        # os dicts já publicados, que são sempre substituídos por inteiro
+        self._cache_lock = threading.Lock()
+        # Snapshot curto da lista de containers por endpoint (single-flight)
+        self._containers = ContainerListCache()
+        # Sessão keep-alive compartilhada (criada no primeiro uso)
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
 
         # Suprime avisos de HTTPS inseguro quando a verificação TLS está desativada
         if self.enabled and not self.verify_tls:
@@ -161,38 +185,90 @@ class PortainerClient:
             "Accept": "application/json",
         }
 
+    def _pool_size(self) -> int:
+        if PORTAINER_POOL_SIZE > 0:
+            return PORTAINER_POOL_SIZE
+        # Todas as chamadas vão para o mesmo host (Portainer faz proxy para cada Docker):
+        # uma conexão por endpoint conhecido ou por worker de verificação, o que for maior
+        endpoints = len(set(self.endpoint_map.values()))
+        return min(64, max(4, PORTAINER_VERIFY_WORKERS + 2, endpoints))
+
+    def _get_session(self) -> requests.Session:
+        """
+        Sessão com pool keep-alive (thread-safe, ver build_pooled_session), usada pelas
+        threads de requisição e pelo PortainerMonitor. Retentativas só para GET, em erro
+        de conexão e 502/503/504; timeout de leitura não é repetido (o prazo já passou).
+        """
+        session = self._session
+        if session is not None:
+            return session
+        with self._session_lock:
+            if self._session is None:
+                retry = Retry(
+                    total=PORTAINER_MAX_RETRIES,
+                    connect=PORTAINER_MAX_RETRIES,
+                    read=0,
+                    status=PORTAINER_MAX_RETRIES,
+                    backoff_factor=PORTAINER_RETRY_BACKOFF_SECONDS,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset({'GET'}),
+                    raise_on_status=False,
+                )
+                pool_size = self._pool_size()
+                session = build_pooled_session(1, pool_size, max_retries=retry, headers=self._headers())
+                session.verify = self.verify_tls
+                self._session = session
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Portainer session pool criado (pool_size={pool_size}, retries={PORTAINER_MAX_RETRIES})")
+            return self._session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
     def _request(self, method: str, path: str, params: Optional[Dict] = None) -> requests.Response:
         if not self.base_url:
             raise RuntimeError("Portainer BASE_URL não configurado")
         url = f"{self.base_url}{path}"
-        resp = requests.request(
-            method,
-            url,
-            headers=self._headers(),
-            params=params,
-            timeout=self.timeout,
-            verify=self.verify_tls,
-        )
+        metric_path = _METRIC_PATH_RE.sub('/:id', path)
+        started = time.perf_counter()
+        try:
+            resp = self._get_session().request(method, url, params=params, timeout=self.timeout)
+        except requests.RequestException:
+            PORTAINER_REQUESTS.inc(method=method, path=metric_path, status='error')
+            raise
+        finally:
+            PORTAINER_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, path=metric_path)
+        PORTAINER_REQUESTS.inc(method=method, path=metric_path, status=str(resp.status_code))
         resp.raise_for_status()
         return resp
 
     def _ensure_endpoints_cache(self) -> None:
         if not self.enabled:
             return
-        now = time.time()
-        if self._endpoints_cache and (now - self._last_refresh) < 60:
+        if self._endpoints_cache and (time.time() - self._last_refresh) < 60:
             return
+        with self._cache_lock:
+            # outra thread pode ter atualizado enquanto esperávamos o lock
+            now = time.time()
+            if self._endpoints_cache and (now - self._last_refresh) < 60:
+                return
+            self._refresh_endpoints_locked(now)
+
+    def _refresh_endpoints_locked(self, now: float) -> None:
         try:
             resp = self._request("GET", "/endpoints")
             data = resp.json()
             if isinstance(data, list):
-                self._endpoints_cache = {item["Id"]: item for item in data if "Id" in item}
                 # também index por nome para fallback
                 self._endpoint_name_map = {
                     str(item.get("Name", "")).lower(): item["Id"]
                     for item in data
                     if "Id" in item
                 }
+                self._endpoints_cache = {item["Id"]: item for item in data if "Id" in item}
                 self._last_refresh = now
                 if DEBUG_MODE:
                     def _ep_info(it: Dict) -> str:
@@ -215,12 +291,49 @@ class PortainerClient:
         self._ensure_endpoints_cache()
         return dict(self._endpoints_cache)
 
-    def list_containers(self, endpoint_id: int, all: bool = False) -> List[Dict]:
-        """Lista containers em um endpoint específico."""
-        params = {'all': 1 if all else 0}
+    def _fetch_containers(self, endpoint_id: int, filters: Optional[Dict[str, List[str]]] = None) -> List[Dict]:
+        params: Dict[str, Any] = {'all': 1}
+        if filters:
+            params['filters'] = json.dumps(filters, separators=(',', ':'))
         resp = self._request("GET", f"/endpoints/{endpoint_id}/docker/containers/json", params=params)
         return resp.json() if resp.content else []
 
+    def find_containers_by_name(self, endpoint_id: int, names: Iterable[str]) -> List[Dict]:
+        """
+        Containers (all=1) cujo nome é exatamente um dos `names` (sem diferenciar maiúsculas).
+        Com snapshot em cache filtra localmente; senão pede ao Docker só esses nomes via
+        `filters` (regex ancorada). Sem filtro no servidor, ou se a consulta filtrada falhar,
+        filtra a lista completa.
+        """
+        wanted = {str(n).strip().lstrip('/').lower() for n in names if n}
+        wanted.discard('')
+        if not wanted:
+            return []
+        containers = self._containers.peek(endpoint_id)
+        if containers is None and self.server_filters:
+            try:
+                containers = self._fetch_containers(endpoint_id, {'name': [_name_filter(wanted)]})
+            except Exception as exc:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Portainer: consulta filtrada por nome falhou, usando lista completa: {exc}")
+        if containers is None:
+            containers = self.list_containers(endpoint_id, all=True)
+        return [
+            c for c in containers
+            if any(str(n).lstrip('/').lower() in wanted for n in (c.get('Names') or []))
+        ]
+
+    def list_containers(self, endpoint_id: int, all: bool = False, allow_stale: bool = True) -> List[Dict]:
+        """
+        Lista containers em um endpoint específico, a partir do snapshot em cache (all=1).
+        Com all=False devolve só os que o Docker lista sem `all` (running, paused, restarting).
+        allow_stale=False não aceita snapshot vencido (o PortainerMonitor quer o estado atual).
+        """
+        containers = self._containers.get(endpoint_id, lambda: self._fetch_containers(endpoint_id), allow_stale=allow_stale)
+        if all:
+            return containers
+        return [c for c in containers if str(c.get('State') or '').lower() in RUNNING_STATES]
+
     # ---------- Public API ----------
     def get_host_for_endpoint(self, endpoint_id: int, prefer_ip: bool = True) -> Optional[str]:
         """Retorna uma chave (host/IP) do mapa que aponte para o endpoint_id.
@@ -260,7 +373,7 @@ class PortainerClient:
                 return self.endpoint_map[short]
 
         # 2) match por nome de endpoint (case insensitive)
-        endpoint_name_map = getattr(self, "_endpoint_name_map", {})
+        endpoint_name_map = self._endpoint_name_map
         if cleaned in endpoint_name_map:
             return endpoint_name_map[cleaned]
 
@@ -271,31 +384,6 @@ class PortainerClient:
 
         return None
 
-    def _match_container_name(self, names: Iterable[str], candidates: Iterable[str]) -> Optional[str]:
-        normalized_candidates = {_normalize_name(c) for c in candidates if c}
-        normalized_candidates.discard(None)
-        if not normalized_candidates:
-            return None
-
-        normalized_names = {_normalize_name(n) for n in names if n}
-        normalized_names.discard(None)
-
-        # Match exato
-        for candidate in normalized_candidates:
-            if candidate in normalized_names:
-                return candidate
-
-        if self.strict_name_match:
-            return None
-
-        # Fallback por prefixo/contain
-        for name in normalized_names:
-            for candidate in normalized_candidates:
-                if candidate and name and (candidate in name or name in candidate):
-                    return name
-
-        return None
-
     def _collect_candidate_names(self, labels: Dict) -> List[str]:
         candidates = []
         keys = [
@@ -323,8 +411,12 @@ class PortainerClient:
 
         return candidates
 
-    def verify_container(self, host: Optional[str], labels: Dict) -> Dict:
-        """Retorna dict com informações da verificação via Portainer."""
+    def verify_container(self, host: Optional[str], labels: Dict, server_filter: bool = True) -> Dict:
+        """
+        Retorna dict com informações da verificação via Portainer.
+        server_filter=False dispensa a consulta filtrada por nome e vai direto ao snapshot
+        (vários alertas do mesmo endpoint no payload compartilham uma única listagem).
+        """
         result = {
             'enabled': self.enabled,
             'verified': False,
@@ -351,20 +443,25 @@ class PortainerClient:
         if DEBUG_MODE:
             print(f"[DEBUG] Portainer candidatos de nome para {host}: {candidates}")
 
-        try:
-            running_resp = self._request(
-                "GET",
-                f"/endpoints/{endpoint_id}/docker/containers/json",
-                params={'all': 0},
-            )
-            running_containers = running_resp.json() if running_resp.content else []
-        except Exception as exc:
-            result['error'] = f"api_error_running:{exc}"
-            if DEBUG_MODE:
-                print(f"[DEBUG] Portainer erro ao listar containers running: {exc}")
-            return result if self.fail_open else result
+        # Sem snapshot em cache, pede ao Docker só os containers com o nome de algum
+        # candidato; a resposta só vale se ali houver um container running (ver
+        # _filtered_name_index). Caso contrário usa a lista completa: uma única lista
+        # (snapshot all=1) e o índice de nomes dela atendem as duas buscas, primeiro entre
+        # os running, como o Docker lista sem `all`, depois entre todos
+        name_index = None
+        if server_filter and self.server_filters and self._containers.peek(endpoint_id) is None:
+            name_index = self._filtered_name_index(endpoint_id, candidates)
+        if name_index is None:
+            try:
+                all_containers = self.list_containers(endpoint_id, all=True)
+            except Exception as exc:
+                result['error'] = f"api_error_running:{exc}"
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Portainer erro ao listar containers running: {exc}")
+                return result if self.fail_open else result
+            name_index = self._containers.name_index(endpoint_id, all_containers)
 
-        match_info = self._find_match_in_list(running_containers, candidates)
+        match_info = name_index.lookup(candidates, self.strict_name_match, running_only=True)
         if match_info:
             result.update(match_info)
             result['endpoint_id'] = endpoint_id
@@ -374,20 +471,7 @@ class PortainerClient:
             return result
 
         # tenta all=1
-        try:
-            all_resp = self._request(
-                "GET",
-                f"/endpoints/{endpoint_id}/docker/containers/json",
-                params={'all': 1},
-            )
-            all_containers = all_resp.json() if all_resp.content else []
-        except Exception as exc:
-            result['error'] = f"api_error_all:{exc}"
-            if DEBUG_MODE:
-                print(f"[DEBUG] Portainer erro ao listar containers all: {exc}")
-            return result if self.fail_open else result
-
-        match_info = self._find_match_in_list(all_containers, candidates)
+        match_info = name_index.lookup(candidates, self.strict_name_match)
         if not match_info:
             result['endpoint_id'] = endpoint_id
             result['verified'] = True
@@ -426,27 +510,32 @@ class PortainerClient:
         result['health'] = health.get('Status')
         return result
 
-    def _find_match_in_list(self, containers: Iterable[Dict], candidates: List[str]) -> Optional[Dict]:
-        for entry in containers or []:
-            names = entry.get('Names') or []
-            match = self._match_container_name(names, candidates)
-            if match:
-                return {
-                    'container_id': entry.get('Id'),
-                    'matched_name': match,
-                    'status': entry.get('State') or entry.get('Status'),
-                }
+    def _filtered_name_index(self, endpoint_id: int, candidates: List[str]) -> Optional[ContainerNameIndex]:
+        """
+        Índice sobre a consulta filtrada por nome, usado só quando ele tem um container
+        running que casa. Um container parado com o nome exato não basta: na lista
+        completa a busca entre os running vem antes e pode achar outro container (match
+        parcial, como `api` -> `api-green`, ou pelo label do compose/kubernetes) que o
+        filtro de nome não enxerga. Retorna None nesses casos e se a consulta falhar.
+        """
+        names = {str(c).strip().lstrip('/').lower() for c in candidates if c}
+        names.discard('')
+        if not names:
+            return None
+        try:
+            containers = self._fetch_containers(endpoint_id, {'name': [_name_filter(names)]})
+        except Exception as exc:
+            if DEBUG_MODE:
+                print(f"[DEBUG] Portainer: consulta filtrada por nome falhou, usando lista completa: {exc}")
+            return None
+        index = ContainerNameIndex(containers)
+        if index.lookup(candidates, self.strict_name_match, running_only=True) is None:
+            return None
+        return index
 
-            labels = entry.get('Labels', {}) or {}
-            alt_names = [labels.get('com.docker.compose.service'), labels.get('io.kubernetes.container.name')]
-            match = self._match_container_name(alt_names, candidates)
-            if match:
-                return {
-                    'container_id': entry.get('Id'),
-                    'matched_name': match,
-                    'status': entry.get('State') or entry.get('Status'),
-                }
-        return None
+    def _find_match_in_list(self, containers: Iterable[Dict], candidates: List[str]) -> Optional[Dict]:
+        """Match numa lista avulsa (fora do snapshot em cache): monta um índice só para ela."""
+        return ContainerNameIndex(containers).lookup(candidates, self.strict_name_match)
 
     # ---------- Map reload ----------
     def _maybe_reload_endpoint_map(self) -> None:
@@ -457,14 +546,17 @@ class PortainerClient:
         except Exception:
             return
         if mtime and mtime != getattr(self, "_map_mtime", 0.0):
-            new_map = _load_endpoint_map(self.endpoint_map_path)
-            new_meta = _load_endpoint_meta(self.endpoint_map_path)
-            if new_map:
-                self.endpoint_map = new_map
-                self.endpoint_meta = new_meta
-                self._map_mtime = mtime
-                if DEBUG_MODE:
-                    print(f"[DEBUG] Portainer endpoint_map recarregado ({len(self.endpoint_map)} chaves)")
+            with self._cache_lock:
+                if mtime == self._map_mtime:
+                    return
+                new_map = _load_endpoint_map(self.endpoint_map_path)
+                new_meta = _load_endpoint_meta(self.endpoint_map_path)
+                if new_map:
+                    self.endpoint_map = new_map
+                    self.endpoint_meta = new_meta
+                    self._map_mtime = mtime
+                    if DEBUG_MODE:
+                        print(f"[DEBUG] Portainer endpoint_map recarregado ({len(self.endpoint_map)} chaves)")
 
     # ---------- Helpers públicos extra ----------
     def get_host_for_endpoint(self, endpoint_id: int, prefer_ip: bool = True) -> Optional[str]:
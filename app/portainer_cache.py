@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .constants import DEBUG_MODE, PORTAINER_CONTAINER_CACHE_TTL_SECONDS, PORTAINER_CONTAINER_CACHE_STALE_SECONDS
+from .portainer_index import ContainerNameIndex
+
+
+class _Flight:
+    """Requisição em andamento para um endpoint; os demais chamadores esperam o resultado."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[List[Dict]] = None
+        self.error: Optional[BaseException] = None
+
+
+class ContainerListCache:
+    """
+    Snapshot da lista de containers (all=1) por endpoint, com TTL curto.
+
+    - Até `ttl` segundos o snapshot é servido direto da memória.
+    - Entre `ttl` e `ttl + stale` segundos é servido o snapshot antigo e uma thread
+      busca o novo em segundo plano (stale-while-revalidate).
+    - Depois disso (ou sem snapshot) o chamador busca na hora.
+    Em qualquer caso há no máximo uma requisição por endpoint em andamento: chamadores
+    concorrentes esperam a mesma resposta (single-flight), inclusive o erro.
+    Cada snapshot ganha, na primeira verificação, um índice de nomes (name_index).
+    """
+
+    def __init__(self, ttl_seconds: float = PORTAINER_CONTAINER_CACHE_TTL_SECONDS,
+                 stale_seconds: float = PORTAINER_CONTAINER_CACHE_STALE_SECONDS):
+        self.ttl = max(0.0, ttl_seconds)
+        self.stale = max(0.0, stale_seconds)
+        # endpoint_id -> (containers, buscado_em monotonic)
+        self._snapshots: Dict[int, Tuple[List[Dict], float]] = {}
+        self._flights: Dict[int, _Flight] = {}
+        # endpoint_id -> (lista do snapshot, índice montado sobre ela)
+        self._indexes: Dict[int, Tuple[List[Dict], ContainerNameIndex]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint_id: int, fetch: Callable[[], List[Dict]], allow_stale: bool = True) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(endpoint_id)
+            if snapshot is not None:
+                containers, fetched_at = snapshot
+                age = now - fetched_at
+                if age < self.ttl:
+                    return containers
+                if allow_stale and age < self.ttl + self.stale:
+                    if endpoint_id not in self._flights:
+                        flight = self._flights[endpoint_id] = _Flight()
+                        threading.Thread(target=self._run_flight, args=(endpoint_id, fetch, flight),
+                                         name=f"portainer-refresh-{endpoint_id}", daemon=True).start()
+                    return containers
+            flight = self._flights.get(endpoint_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[endpoint_id] = _Flight()
+        if leader:
+            self._run_flight(endpoint_id, fetch, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def peek(self, endpoint_id: int) -> Optional[List[Dict]]:
+        """Snapshot ainda utilizável (dentro de ttl + stale), sem buscar; None se não houver."""
+        with self._lock:
+            snapshot = self._snapshots.get(endpoint_id)
+        if snapshot is None or time.monotonic() - snapshot[1] >= self.ttl + self.stale:
+            return None
+        return snapshot[0]
+
+    def _run_flight(self, endpoint_id: int, fetch: Callable[[], List[Dict]], flight: _Flight):
+        try:
+            flight.result = fetch()
+        except BaseException as exc:
+            flight.error = exc
+            if DEBUG_MODE:
+                print(f"[DEBUG] Portainer: falha ao atualizar containers do endpoint {endpoint_id}: {exc}")
+        with self._lock:
+            if flight.error is None:
+                self._snapshots[endpoint_id] = (flight.result, time.monotonic())
+            self._flights.pop(endpoint_id, None)
+        flight.done.set()
+
+    def name_index(self, endpoint_id: int, containers: List[Dict]) -> ContainerNameIndex:
+        """Índice de nomes da lista devolvida por get(); montado uma vez por snapshot."""
+        with self._lock:
+            cached = self._indexes.get(endpoint_id)
+            if cached is not None and cached[0] is containers:
+                return cached[1]
+        index = ContainerNameIndex(containers)
+        with self._lock:
+            snapshot = self._snapshots.get(endpoint_id)
+            # Só guarda se a lista ainda é o snapshot atual (pode ter sido trocada no meio)
+            if snapshot is not None and snapshot[0] is containers:
+                self._indexes[endpoint_id] = (containers, index)
+        return index
+
+    def invalidate(self, endpoint_id: Optional[int] = None):
+        with self._lock:
+            if endpoint_id is None:
+                self._snapshots.clear()
+                self._indexes.clear()
+            else:
+                self._snapshots.pop(endpoint_id, None)
+                self._indexes.pop(endpoint_id, None)
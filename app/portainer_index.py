@@ -0,0 +1,144 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Estados que o Docker inclui na listagem sem `all` (State.Running=true)
+RUNNING_STATES = {'running', 'paused', 'restarting'}
+
+# Tamanho máximo dos n-gramas indexados para a busca por substring
+_GRAM = 3
+
+
+def _normalize(name: Optional[str]) -> str:
+    if not name:
+        return ''
+    return str(name).strip().lstrip('/').lower()
+
+
+def _grams(value: str, size: int) -> Set[str]:
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class ContainerNameIndex:
+    """
+    Índice de nomes de um snapshot de containers de um endpoint, montado uma vez por
+    snapshot e reaproveitado por todas as verificações até o próximo.
+
+    - Mapa exato nome -> id para `Names`, `com.docker.compose.service` e
+      `io.kubernetes.container.name` (normalizados: sem '/', minúsculos).
+    - N-gramas (1 a 3 caracteres) -> ids de nomes, para o fallback não estrito
+      "candidato contido no nome"; o caso inverso ("nome contido no candidato") consulta
+      o mapa exato com as substrings do candidato.
+    Os n-gramas só são montados na primeira busca não estrita que passar do match exato.
+    Para cada nome guarda a primeira posição na lista (e a primeira entre os running), de
+    modo que lookup() devolve o mesmo container que a varredura na ordem da lista:
+    o primeiro que casa, com `Names` antes dos nomes alternativos e match exato antes do
+    parcial.
+    """
+
+    __slots__ = ('containers', '_ids', '_names', '_first', '_first_running', '_grams', '_lengths')
+
+    def __init__(self, containers: Iterable[Dict]):
+        self.containers: List[Dict] = list(containers or [])
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # id do nome -> (posição do container, grupo: 0 = Names, 1 = compose/kubernetes)
+        self._first: List[Tuple[int, int]] = []
+        self._first_running: List[Optional[Tuple[int, int]]] = []
+        self._grams: Optional[Dict[str, List[int]]] = None
+        self._lengths: Set[int] = set()
+        for pos, entry in enumerate(self.containers):
+            running = str(entry.get('State') or '').lower() in RUNNING_STATES
+            labels = entry.get('Labels') or {}
+            groups = (
+                entry.get('Names') or [],
+                [labels.get('com.docker.compose.service'), labels.get('io.kubernetes.container.name')],
+            )
+            for group, names in enumerate(groups):
+                for raw in names:
+                    name = _normalize(raw)
+                    if not name:
+                        continue
+                    nid = self._ids.get(name)
+                    if nid is None:
+                        nid = self._add(name, (pos, group))
+                    # posições só crescem: a primeira ocorrência já é a menor
+                    if running and self._first_running[nid] is None:
+                        self._first_running[nid] = (pos, group)
+
+    def _add(self, name: str, first: Tuple[int, int]) -> int:
+        nid = len(self._names)
+        self._ids[name] = nid
+        self._names.append(name)
+        self._first.append(first)
+        self._first_running.append(None)
+        self._lengths.add(len(name))
+        return nid
+
+    def _gram_index(self) -> Dict[str, List[int]]:
+        index = self._grams
+        if index is None:
+            index = {}
+            for nid, name in enumerate(self._names):
+                for size in range(1, _GRAM + 1):
+                    for gram in _grams(name, size):
+                        index.setdefault(gram, []).append(nid)
+            # Atribuição única: threads concorrentes no máximo montam o índice em dobro
+            self._grams = index
+        return index
+
+    def _containing(self, candidate: str) -> List[int]:
+        """Ids dos nomes que contêm `candidate` (pela menor lista de n-gramas, conferida)."""
+        index = self._gram_index()
+        postings = [index.get(gram) for gram in _grams(candidate, min(_GRAM, len(candidate)))]
+        if not postings or any(p is None for p in postings):
+            return []
+        smallest = min(postings, key=len)
+        names = self._names
+        return [nid for nid in smallest if candidate in names[nid]]
+
+    def _contained(self, candidate: str) -> List[int]:
+        """Ids dos nomes que são substring de `candidate` (só comprimentos existentes)."""
+        found = []
+        size = len(candidate)
+        for length in self._lengths:
+            if length > size:
+                continue
+            for start in range(size - length + 1):
+                nid = self._ids.get(candidate[start:start + length])
+                if nid is not None:
+                    found.append(nid)
+        return found
+
+    def lookup(self, candidates: Iterable[str], strict: bool, running_only: bool = False) -> Optional[Dict]:
+        """
+        Primeiro container (na ordem do snapshot) cujo nome casa com algum candidato.
+        strict=True aceita só match exato. running_only restringe aos running/paused/restarting.
+        """
+        normalized = {_normalize(c) for c in candidates if c}
+        normalized.discard('')
+        if not normalized:
+            return None
+        first = self._first_running if running_only else self._first
+        best: Optional[Tuple[int, int, int]] = None
+        best_name = None
+        for candidate in normalized:
+            nid = self._ids.get(candidate)
+            if nid is not None and first[nid] is not None:
+                key = first[nid] + (0,)
+                if best is None or key < best:
+                    best, best_name = key, candidate
+        if not strict:
+            for candidate in normalized:
+                for nid in self._containing(candidate) + self._contained(candidate):
+                    if first[nid] is None:
+                        continue
+                    key = first[nid] + (1,)
+                    if best is None or key < best:
+                        best, best_name = key, self._names[nid]
+        if best is None:
+            return None
+        entry = self.containers[best[0]]
+        return {
+            'container_id': entry.get('Id'),
+            'matched_name': best_name,
+            'status': entry.get('State') or entry.get('Status'),
+        }
@@ -1,25 +1,43 @@
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Dict, List, Optional, Tuple
 
 from .constants import (
     DEBUG_MODE,
     ALERT_DEDUP_ENABLED,
     ALERT_COOLDOWN_SECONDS,
-    CONTAINER_ALWAYS_NOTIFY_ALLOWLIST,
     PORTAINER_ACTIVE_MONITOR,
     PORTAINER_MONITOR_INTERVAL_SECONDS,
     PORTAINER_MONITOR_ENDPOINTS,
     PORTAINER_MONITOR_DOWN_CONFIRMATIONS,
     PORTAINER_MONITOR_SCOPE,
     PORTAINER_MONITOR_ONLY_SOURCE,
+    PORTAINER_MONITOR_WORKERS,
+    PORTAINER_MONITOR_ENDPOINT_DEADLINE_SECONDS,
 )
 from .portainer import portainer_client
 from .dedupe import TTLCache, build_alert_fingerprint
+from .throttle import alert_throttle, throttle_host
+from .allowlist import container_allowlist
 from .formatters import format_container_alert
 from .utils import format_timestamp
-from .services import send_discord_payload
-from .suppression import ContainerSuppressor, build_container_key, build_container_key_by_id
+from .delivery import deliver
+from .routing import discord_router
+from .suppression import container_suppressor
+from .metrics import PORTAINER_MONITOR_POLL_SECONDS, PORTAINER_MONITOR_MISSED_DEADLINES
+
+
+def _entry_name(container_entry: Dict) -> Optional[str]:
+    """Nome real do container (Names, Name ou serviço do compose); None se não houver."""
+    names = container_entry.get('Names') or []
+    if names and names[0]:
+        return names[0].lstrip('/')
+    return (
+        (container_entry.get('Name') or '').lstrip('/') or
+        (container_entry.get('Labels') or {}).get('com.docker.compose.service') or
+        None
+    )
 
 
 class PortainerMonitor(threading.Thread):
@@ -39,11 +57,19 @@ class PortainerMonitor(threading.Thread):
         self._running_counts: Dict[Tuple[int, str], int] = {}
         self._down_counts: Dict[Tuple[int, str], int] = {}
         self.down_confirmations = max(1, PORTAINER_MONITOR_DOWN_CONFIRMATIONS)
-        # Supressor de repetição por container
-        self.suppressor = ContainerSuppressor()
+        # Supressor de repetição por container (o mesmo do /alert)
+        self.suppressor = container_suppressor
+        # Consulta dos endpoints em paralelo: um host lento só atrasa a si mesmo
+        self.endpoint_deadline = max(0.1, PORTAINER_MONITOR_ENDPOINT_DEADLINE_SECONDS)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, PORTAINER_MONITOR_WORKERS), thread_name_prefix="portainer-monitor")
+        self._inflight: Dict[int, Future] = {}
+        # endpoint_id -> início (monotonic) da consulta em andamento, gravado pela thread do pool
+        self._poll_started: Dict[int, float] = {}
 
     def stop(self):
         self._stop.set()
+        # Descarta as consultas que ainda estão na fila; as em andamento terminam sozinhas
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     def _should_monitor_endpoint(self, endpoint_id: int, endpoint_name: str) -> bool:
         key_id = str(endpoint_id).lower()
@@ -77,13 +103,31 @@ class PortainerMonitor(threading.Thread):
                 print("[DEBUG] PortainerMonitor abortado: client desabilitado")
             return
 
-        while not self._stop.is_set():
-            try:
-                self._loop_once()
-            except Exception as exc:
-                if DEBUG_MODE:
-                    print(f"[DEBUG] PortainerMonitor erro no loop: {exc}")
-            self._stop.wait(self.interval)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._loop_once()
+                except Exception as exc:
+                    if DEBUG_MODE:
+                        print(f"[DEBUG] PortainerMonitor erro no loop: {exc}")
+                self._stop.wait(self.interval)
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll_endpoint(self, eid: int, name: str) -> List[Dict]:
+        """Executa no pool: lista todos os containers (inclui parados) para transições DOWN."""
+        started = time.monotonic()
+        self._poll_started[eid] = started
+        result = 'ok'
+        try:
+            if DEBUG_MODE:
+                print(f"[DEBUG] PortainerMonitor: listando containers do endpoint {eid} ({name})")
+            return portainer_client.list_containers(eid, all=True, allow_stale=False)
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            PORTAINER_MONITOR_POLL_SECONDS.observe(time.monotonic() - started, endpoint=str(eid), result=result)
 
     def _loop_once(self):
         if DEBUG_MODE:
@@ -91,139 +135,198 @@ class PortainerMonitor(threading.Thread):
         endpoints = portainer_client.list_endpoints()
         if DEBUG_MODE:
             print(f"[DEBUG] PortainerMonitor: list_endpoints retornou {len(endpoints)} endpoints")
+
+        # Consultas em paralelo (pool limitado); cada resultado é aplicado assim que chega,
+        # nesta thread, então o estado de transição continua com um único escritor
+        pending: Dict[Future, Tuple[int, str]] = {}
         for eid, meta in endpoints.items():
             name = meta.get('Name') or str(eid)
             if not self._should_monitor_endpoint(eid, name):
                 continue
-
-            # Lista todos os containers (inclui parados) para transições DOWN
-            try:
-                if DEBUG_MODE:
-                    print(f"[DEBUG] PortainerMonitor: listando containers do endpoint {eid} ({name})")
-                all_containers = portainer_client.list_containers(eid, all=True)
-                if DEBUG_MODE:
-                    print(f"[DEBUG] PortainerMonitor: retornou {len(all_containers or [])} containers do endpoint {eid}")
-            except Exception as exc:
+            previous = self._inflight.get(eid)
+            if previous is not None and not previous.done():
+                # Consulta de um ciclo anterior ainda presa: não empilha outra
+                PORTAINER_MONITOR_MISSED_DEADLINES.inc(endpoint=str(eid))
                 if DEBUG_MODE:
-                    print(f"[DEBUG] PortainerMonitor falha ao listar containers endpoint {eid}: {exc}")
+                    print(f"[DEBUG] PortainerMonitor: endpoint {eid} ({name}) ainda sem resposta do ciclo anterior")
                 continue
-
-            # Monta snapshot atual
-            current: Dict[Tuple[int, str], bool] = {}
-            
-            # Deduplica containers por ID (Portainer às vezes retorna duplicados)
-            seen_containers = {}
-            for entry in all_containers or []:
-                cid = entry.get('Id')
-                if not cid:
-                    continue
-                if cid in seen_containers:
+            self._poll_started.pop(eid, None)
+            future = self._executor.submit(self._poll_endpoint, eid, name)
+            self._inflight[eid] = future
+            pending[future] = (eid, name)
+
+        # O prazo de cada endpoint conta a partir do início da consulta dele (não da fila);
+        # o que nem começou até intervalo + prazo é cancelado. A espera é em fatias de no
+        # máximo 1s para que stop() seja atendido sem aguardar as consultas pendentes
+        cycle_deadline = time.monotonic() + max(self.interval, 0) + self.endpoint_deadline
+        while pending:
+            if self._stop.is_set():
+                if DEBUG_MODE:
+                    print(f"[DEBUG] PortainerMonitor: parada solicitada, abandonando {len(pending)} consulta(s)")
+                for future in pending:
+                    future.cancel()
+                break
+            now = time.monotonic()
+            deadlines = [cycle_deadline, now + 1.0]
+            for eid, _ in pending.values():
+                started = self._poll_started.get(eid)
+                if started is not None:
+                    deadlines.append(started + self.endpoint_deadline)
+            done, _ = wait(list(pending), timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                eid, name = pending.pop(future)
+                try:
+                    all_containers = future.result()
+                except Exception as exc:
                     if DEBUG_MODE:
-                        names = entry.get('Names') or []
-                        cname = names[0].lstrip('/') if names else cid[:12]
-                        print(f"[DEBUG] PortainerMonitor: container duplicado ignorado (eid={eid}, cid={cid[:12]}, name={cname})")
+                        print(f"[DEBUG] PortainerMonitor falha ao listar containers endpoint {eid}: {exc}")
                     continue
-                seen_containers[cid] = entry
-            
-            for entry in seen_containers.values():
-                cid = entry.get('Id')
-                if not cid:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] PortainerMonitor: retornou {len(all_containers or [])} containers do endpoint {eid}")
+                try:
+                    self._apply_snapshot(eid, all_containers)
+                except Exception as exc:
+                    if DEBUG_MODE:
+                        print(f"[DEBUG] PortainerMonitor erro ao processar endpoint {eid}: {exc}")
+            now = time.monotonic()
+            for future, (eid, name) in list(pending.items()):
+                started = self._poll_started.get(eid)
+                if started is not None:
+                    if now < started + self.endpoint_deadline:
+                        continue
+                elif now < cycle_deadline or not future.cancel():
                     continue
-                    
-                # Debug: log início do processamento
+                # Perdeu o prazo: o endpoint fica sem transições neste ciclo
+                pending.pop(future)
+                PORTAINER_MONITOR_MISSED_DEADLINES.inc(endpoint=str(eid))
+                if DEBUG_MODE:
+                    print(f"[DEBUG] PortainerMonitor: endpoint {eid} ({name}) passou do prazo de {self.endpoint_deadline}s")
+
+    def _apply_snapshot(self, eid: int, all_containers: List[Dict]):
+        """Compara a lista de containers do endpoint com o ciclo anterior e emite as transições."""
+        # Monta snapshot atual
+        current: Dict[Tuple[int, str], bool] = {}
+        
+        # Deduplica containers por ID (Portainer às vezes retorna duplicados)
+        seen_containers = {}
+        for entry in all_containers or []:
+            cid = entry.get('Id')
+            if not cid:
+                continue
+            if cid in seen_containers:
                 if DEBUG_MODE:
                     names = entry.get('Names') or []
-                    debug_name = names[0].lstrip('/') if names else cid[:12]
-                    print(f"[DEBUG] PortainerMonitor: processando container (eid={eid}, cid={cid[:12]}, name={debug_name})")
-                    
-                state = entry.get('State') or ''
-                status = entry.get('Status') or ''
-                s_state = str(state).lower()
-                s_status = str(status).lower()
-                combined = f"{s_state} {s_status}".strip()
-                # Considera 'paused' como não-running, e estados óbvios de down
-                is_paused = 'paused' in combined
-                is_exited = 'exited' in combined or 'dead' in combined or 'created' in combined or 'stopped' in combined or 'removing' in combined
-                # running se: state indica running OU status começa com 'up', mas não estiver paused
-                running = ((s_state == 'running') or s_status.startswith('up')) and not (is_paused or is_exited)
-                current[(eid, cid)] = running
-
-                # Atualiza contadores de histerese
-                key = (eid, cid)
-                if running:
-                    self._running_counts[key] = self._running_counts.get(key, 0) + 1
-                    self._down_counts[key] = 0
+                    cname = names[0].lstrip('/') if names else cid[:12]
+                    print(f"[DEBUG] PortainerMonitor: container duplicado ignorado (eid={eid}, cid={cid[:12]}, name={cname})")
+                continue
+            seen_containers[cid] = entry
+        
+        for entry in seen_containers.values():
+            cid = entry.get('Id')
+            if not cid:
+                continue
+                
+            # Debug: log início do processamento
+            if DEBUG_MODE:
+                names = entry.get('Names') or []
+                debug_name = names[0].lstrip('/') if names else cid[:12]
+                print(f"[DEBUG] PortainerMonitor: processando container (eid={eid}, cid={cid[:12]}, name={debug_name})")
+                
+            state = entry.get('State') or ''
+            status = entry.get('Status') or ''
+            s_state = str(state).lower()
+            s_status = str(status).lower()
+            combined = f"{s_state} {s_status}".strip()
+            # Considera 'paused' como não-running, e estados óbvios de down
+            is_paused = 'paused' in combined
+            is_exited = 'exited' in combined or 'dead' in combined or 'created' in combined or 'stopped' in combined or 'removing' in combined
+            # running se: state indica running OU status começa com 'up', mas não estiver paused
+            running = ((s_state == 'running') or s_status.startswith('up')) and not (is_paused or is_exited)
+            current[(eid, cid)] = running
+
+            # Atualiza contadores de histerese
+            key = (eid, cid)
+            if running:
+                self._running_counts[key] = self._running_counts.get(key, 0) + 1
+                self._down_counts[key] = 0
+            else:
+                # se não está rodando, incrementa contador de 'down' consecutivo
+                self._running_counts.setdefault(key, 0)
+                self._down_counts[key] = self._down_counts.get(key, 0) + 1
+
+            # Detecta transição RUNNING -> NÃO RUNNING (queda)
+            prev = self._prev_state.get((eid, cid))
+            if prev is True and running is False:
+                # Requer múltiplas confirmações para reduzir falsos positivos
+                if self._down_counts.get(key, 0) >= self.down_confirmations:
+                    self._emit_down_alert(eid, entry)
                 else:
-                    # se não está rodando, incrementa contador de 'down' consecutivo
-                    self._running_counts.setdefault(key, 0)
-                    self._down_counts[key] = self._down_counts.get(key, 0) + 1
-
-                # Detecta transição RUNNING -> NÃO RUNNING (queda)
-                prev = self._prev_state.get((eid, cid))
-                if prev is True and running is False:
-                    # Requer múltiplas confirmações para reduzir falsos positivos
-                    if self._down_counts.get(key, 0) >= self.down_confirmations:
-                        self._emit_down_alert(eid, entry)
-                    else:
-                        if DEBUG_MODE:
-                            rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
-                            print(f"[DEBUG] PortainerMonitor: queda não confirmada (eid={eid}, name={rn}, down_count={self._down_counts.get(key,0)}, ran_count={self._running_counts.get(key,0)})")
-                # Detecta transição NÃO RUNNING -> RUNNING (recuperação)
-                elif prev is False and running is True:
-                    # Container voltou a funcionar
-                    if self._running_counts.get(key, 0) >= 1:  # Confirma que está realmente UP
-                        self._emit_up_alert(eid, entry)
-                    else:
-                        if DEBUG_MODE:
-                            rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
-                            print(f"[DEBUG] PortainerMonitor: recuperação não confirmada (eid={eid}, name={rn}, run_count={self._running_counts.get(key,0)})")
-                # Novo: caso ainda não tenhamos visto este container running antes (prev != True), mas ele está
-                # em estado não-running por confirmações suficientes (ex.: paused), emitir também.
-                elif prev is not True and running is False:
-                    if self._down_counts.get(key, 0) >= self.down_confirmations:
-                        self._emit_down_alert(eid, entry)
-                    else:
-                        if DEBUG_MODE:
-                            rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
-                            print(f"[DEBUG] PortainerMonitor: estado não-running observado (eid={eid}, name={rn}), aguardando confirmações (down_count={self._down_counts.get(key,0)})")
-
-            # Atualiza transições para containers que sumiram da lista (ex.: removidos)
-            for (peid, pcid), was_running in list(self._prev_state.items()):
-                if peid != eid:
-                    continue
-                if (peid, pcid) not in current and was_running is True:
-                    # Container não aparece: confirmar com histerese antes de alertar
-                    key = (peid, pcid)
-                    self._down_counts[key] = self._down_counts.get(key, 0) + 1
-                    if self._down_counts[key] >= self.down_confirmations:
-                        phantom = {'Id': pcid, 'Names': [], 'State': 'exited'}
-                        self._emit_down_alert(eid, phantom)
-                    else:
-                        if DEBUG_MODE:
-                            print(f"[DEBUG] PortainerMonitor: desaparecimento não confirmado (eid={eid}, cid={pcid[:12]}, down_count={self._down_counts.get(key,0)}, ran_count={self._running_counts.get(key,0)})")
-
-            # Persiste snapshot
-            for key, val in current.items():
-                self._prev_state[key] = val
-
-            # Limpa contadores de chaves muito antigas (não vistas no snapshot atual)
-            stale_keys = [k for k in list(self._running_counts.keys()) if k[0] == eid and k not in current]
-            for sk in stale_keys:
-                # mantemos down_counts para confirmar desaparecimento por alguns ciclos; não removemos imediatamente
-                pass
+                    if DEBUG_MODE:
+                        rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
+                        print(f"[DEBUG] PortainerMonitor: queda não confirmada (eid={eid}, name={rn}, down_count={self._down_counts.get(key,0)}, ran_count={self._running_counts.get(key,0)})")
+            # Detecta transição NÃO RUNNING -> RUNNING (recuperação)
+            elif prev is False and running is True:
+                # Container voltou a funcionar
+                if self._running_counts.get(key, 0) >= 1:  # Confirma que está realmente UP
+                    self._emit_up_alert(eid, entry)
+                else:
+                    if DEBUG_MODE:
+                        rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
+                        print(f"[DEBUG] PortainerMonitor: recuperação não confirmada (eid={eid}, name={rn}, run_count={self._running_counts.get(key,0)})")
+            # Novo: caso ainda não tenhamos visto este container running antes (prev != True), mas ele está
+            # em estado não-running por confirmações suficientes (ex.: paused), emitir também.
+            elif prev is not True and running is False:
+                if self._down_counts.get(key, 0) >= self.down_confirmations:
+                    self._emit_down_alert(eid, entry)
+                else:
+                    if DEBUG_MODE:
+                        rn = entry.get('Names', [''])[0].lstrip('/') if entry.get('Names') else (cid[:12])
+                        print(f"[DEBUG] PortainerMonitor: estado não-running observado (eid={eid}, name={rn}), aguardando confirmações (down_count={self._down_counts.get(key,0)})")
+
+        # Atualiza transições para containers que sumiram da lista (ex.: removidos)
+        for (peid, pcid), was_running in list(self._prev_state.items()):
+            if peid != eid:
+                continue
+            if (peid, pcid) not in current and was_running is True:
+                # Container não aparece: confirmar com histerese antes de alertar
+                key = (peid, pcid)
+                self._down_counts[key] = self._down_counts.get(key, 0) + 1
+                if self._down_counts[key] >= self.down_confirmations:
+                    phantom = {'Id': pcid, 'Names': [], 'State': 'exited'}
+                    self._emit_down_alert(eid, phantom)
+                else:
+                    if DEBUG_MODE:
+                        print(f"[DEBUG] PortainerMonitor: desaparecimento não confirmado (eid={eid}, cid={pcid[:12]}, down_count={self._down_counts.get(key,0)}, ran_count={self._running_counts.get(key,0)})")
+
+        # Persiste snapshot
+        for key, val in current.items():
+            self._prev_state[key] = val
+
+        # Limpa contadores de chaves muito antigas (não vistas no snapshot atual)
+        stale_keys = [k for k in list(self._running_counts.keys()) if k[0] == eid and k not in current]
+        for sk in stale_keys:
+            # mantemos down_counts para confirmar desaparecimento por alguns ciclos; não removemos imediatamente
+            pass
+
+    def _suppression_key(self, endpoint_id: int, container_entry: Dict) -> str:
+        """
+        Chave de supressão do container. Sem IP no mapa, o host da chave é o endpoint
+        (containers homônimos em endpoints distintos não dividem estado). O nome
+        sintético `container-<id>` nunca entra na chave: nesse caso vale só o ID.
+        """
+        host = portainer_client.get_host_for_endpoint(endpoint_id) or f"endpoint-{endpoint_id}"
+        return self.suppressor.resolve_key(
+            host,
+            container_name=_entry_name(container_entry),
+            container_id=container_entry.get('Id'),
+        )
 
     def _emit_up_alert(self, endpoint_id: int, container_entry: Dict):
-        # Extrai nome com múltiplos fallbacks
-        names = container_entry.get('Names') or []
-        if names and len(names) > 0:
-            container_name = names[0].lstrip('/')
-        else:
-            # Tenta outros campos
-            container_name = (
-                container_entry.get('Name', '').lstrip('/') or
-                container_entry.get('Labels', {}).get('com.docker.compose.service', '') or
-                f"container-{container_entry.get('Id', 'unknown')[:12]}"
-            )
+        # Extrai nome com múltiplos fallbacks (o último é sintético, derivado do ID)
+        container_name = (
+            _entry_name(container_entry) or
+            f"container-{container_entry.get('Id', 'unknown')[:12]}"
+        )
 
         if DEBUG_MODE:
             print(f"[DEBUG] PortainerMonitor: recuperação detectada - endpoint={endpoint_id} container={container_name}")
@@ -280,9 +383,7 @@ class PortainerMonitor(threading.Thread):
 
         # Supressão por estado (evita spam de UP)
         try:
-            mapped_ip = enriched_info.get('real_ip')
-            cid = container_entry.get('Id')
-            key = build_container_key_by_id(mapped_ip, cid)
+            key = self._suppression_key(endpoint_id, container_entry)
             current_state = 'running'
             
             # Passar portainer_client e endpoint_id para verificação blue/green
@@ -304,14 +405,17 @@ class PortainerMonitor(threading.Thread):
 
         # Dedupe (pula se estiver no allowlist de "sempre notificar")
         fp = build_alert_fingerprint('container', alert_data['labels'], enriched_info, alert_status='resolved')
-        cname_norm = (container_name or '').strip().lower()
-        always_notify = cname_norm in {n.strip().lower() for n in CONTAINER_ALWAYS_NOTIFY_ALLOWLIST}
+        always_notify = container_allowlist.is_always_notify(container_name)
+        # Throttle antes do dedupe: descartado aqui não entra no cooldown
+        host = throttle_host(alert_data['labels'], enriched_info)
+        if not always_notify and not alert_throttle.allow(host, 'container'):
+            return
         if ALERT_DEDUP_ENABLED and not always_notify:
-            if self.dedupe_cache.is_within_ttl(fp):
+            if self.dedupe_cache.check_and_touch(fp):
+                alert_throttle.refund(host, 'container')
                 if DEBUG_MODE:
                     print(f"[DEBUG] PortainerMonitor UP: alerta suprimido por dedupe: {fp}")
                 return
-            self.dedupe_cache.touch(fp)
 
         content = format_container_alert(
             alert_data,
@@ -344,20 +448,15 @@ class PortainerMonitor(threading.Thread):
         if DEBUG_MODE:
             print(f"[DEBUG] PortainerMonitor: enviando alerta de UP para {container_name} (endpoint {endpoint_id})")
 
-        send_discord_payload(content=content, embeds=[embed])
+        webhooks = discord_router.route('container', 'container_up', alert_data['labels'], status='resolved')
+        deliver(content=content, embeds=[embed], webhooks=webhooks)
 
     def _emit_down_alert(self, endpoint_id: int, container_entry: Dict):
-        # Extrai nome com múltiplos fallbacks
-        names = container_entry.get('Names') or []
-        if names and len(names) > 0:
-            container_name = names[0].lstrip('/')
-        else:
-            # Tenta outros campos
-            container_name = (
-                container_entry.get('Name', '').lstrip('/') or
-                container_entry.get('Labels', {}).get('com.docker.compose.service', '') or
-                f"container-{container_entry.get('Id', 'unknown')[:12]}"
-            )
+        # Extrai nome com múltiplos fallbacks (o último é sintético, derivado do ID)
+        container_name = (
+            _entry_name(container_entry) or
+            f"container-{container_entry.get('Id', 'unknown')[:12]}"
+        )
 
         if DEBUG_MODE:
             print(f"[DEBUG] PortainerMonitor: queda detectada - endpoint={endpoint_id} container={container_name}")
@@ -417,11 +516,9 @@ class PortainerMonitor(threading.Thread):
         }
 
         # Supressão por estado (bloqueia reenvio até voltar a running)
-        # Respeita o whitelist (CONTAINER_ALWAYS_NOTIFY_ALLOWLIST)
+        # Respeita o whitelist (CONTAINER_ALWAYS_NOTIFY_ALLOWLIST, via container_allowlist)
         try:
-            mapped_ip = enriched_info.get('real_ip')
-            cid = container_entry.get('Id')
-            key = build_container_key_by_id(mapped_ip, cid)
+            key = self._suppression_key(endpoint_id, container_entry)
             current_state = 'down' if state_norm not in ['running', 'paused'] else state_norm
             
             # Passar portainer_client e endpoint_id para verificação blue/green
@@ -443,14 +540,17 @@ class PortainerMonitor(threading.Thread):
 
         # Dedupe (pula se estiver no allowlist de "sempre notificar")
         fp = build_alert_fingerprint('container', alert_data['labels'], enriched_info, alert_status='firing')
-        cname_norm = (container_name or '').strip().lower()
-        always_notify = cname_norm in {n.strip().lower() for n in CONTAINER_ALWAYS_NOTIFY_ALLOWLIST}
+        always_notify = container_allowlist.is_always_notify(container_name)
+        # Throttle antes do dedupe: descartado aqui não entra no cooldown
+        host = throttle_host(alert_data['labels'], enriched_info)
+        if not always_notify and not alert_throttle.allow(host, 'container'):
+            return
         if ALERT_DEDUP_ENABLED and not always_notify:
-            if self.dedupe_cache.is_within_ttl(fp):
+            if self.dedupe_cache.check_and_touch(fp):
+                alert_throttle.refund(host, 'container')
                 if DEBUG_MODE:
                     print(f"[DEBUG] PortainerMonitor: alerta suprimido por dedupe: {fp}")
                 return
-            self.dedupe_cache.touch(fp)
 
         content = format_container_alert(
             alert_data,
@@ -483,7 +583,8 @@ class PortainerMonitor(threading.Thread):
         if DEBUG_MODE:
             print(f"[DEBUG] PortainerMonitor: enviando alerta de DOWN para {container_name} (endpoint {endpoint_id})")
 
-        send_discord_payload(content=content, embeds=[embed])
+        webhooks = discord_router.route('container', 'container_down', alert_data['labels'], status='firing')
+        deliver(content=content, embeds=[embed], webhooks=webhooks)
 
 
 def start_portainer_monitor(dedupe_cache: TTLCache):
@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from .constants import DEBUG_MODE, DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS
+
+
+def _parse_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    __slots__ = ('lock', 'remaining', 'reset_at')
+
+    def __init__(self):
+        # lock protege a reserva de cota por webhook (nunca mantido durante a espera)
+        self.lock = threading.Lock()
+        self.remaining: Optional[int] = None  # None = desconhecido (ainda sem headers)
+        self.reset_at = 0.0  # time.monotonic() em que o bucket reabre
+
+
+class DiscordRateLimiter:
+    """
+    Acompanha o bucket de rate limit do Discord por webhook, a partir dos headers
+    X-RateLimit-Remaining / X-RateLimit-Reset-After e do retry_after das respostas 429.
+    acquire() espera preventivamente quando a cota acabou, em vez de esperar o 429.
+    """
+
+    def __init__(self, max_wait_seconds: float = DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS):
+        self.max_wait = max(0.0, max_wait_seconds)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _bucket(self, url: str) -> _Bucket:
+        bucket = self._buckets.get(url)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(url, _Bucket())
+        return bucket
+
+    def acquire(self, url: str) -> float:
+        """Reserva uma requisição no bucket do webhook; retorna o tempo esperado (s)."""
+        bucket = self._bucket(url)
+        waited = 0.0
+        while True:
+            # A espera é calculada com o lock, mas o sleep acontece fora dele: as outras
+            # threads do mesmo webhook continuam podendo consultar/atualizar o bucket
+            with bucket.lock:
+                now = time.monotonic()
+                if bucket.reset_at <= now:
+                    # janela expirou: a cota real só é conhecida na próxima resposta
+                    if bucket.remaining is not None and bucket.remaining <= 0:
+                        bucket.remaining = None
+                    return waited
+                if bucket.remaining is None or bucket.remaining > 0:
+                    if bucket.remaining is not None:
+                        bucket.remaining -= 1
+                    return waited
+                wait = min(bucket.reset_at - now, self.max_wait - waited)
+                if wait <= 0:
+                    # Esperou o máximo permitido: segue e deixa o 429 (se vier) corrigir o bucket
+                    bucket.remaining = None
+                    return waited
+            if DEBUG_MODE:
+                print(f"[DEBUG] Discord rate limit: aguardando {wait:.2f}s antes do próximo envio")
+            time.sleep(wait)
+            waited += wait
+
+    def update(self, url: str, resp) -> Optional[float]:
+        """
+        Atualiza o bucket com os headers da resposta.
+        Retorna o retry_after (s) quando a resposta for 429, senão None.
+        """
+        bucket = self._bucket(url)
+        headers = getattr(resp, 'headers', None) or {}
+        now = time.monotonic()
+        retry_after = None
+
+        if resp.status_code == 429:
+            try:
+                body = resp.json()
+            except Exception:
+                body = {}
+            retry_after = _parse_float(body.get('retry_after') if isinstance(body, dict) else None)
+            if retry_after is None:
+                retry_after = _parse_float(headers.get('Retry-After'))
+            if retry_after is None:
+                retry_after = _parse_float(headers.get('X-RateLimit-Reset-After'))
+            retry_after = max(0.0, retry_after if retry_after is not None else 1.0)
+
+        with bucket.lock:
+            if retry_after is not None:
+                bucket.remaining = 0
+                bucket.reset_at = now + retry_after
+                return retry_after
+            remaining = _parse_float(headers.get('X-RateLimit-Remaining'))
+            reset_after = _parse_float(headers.get('X-RateLimit-Reset-After'))
+            if remaining is not None:
+                bucket.remaining = int(remaining)
+            if reset_after is not None:
+                bucket.reset_at = now + reset_after
+        return None
+
+
+discord_rate_limiter = DiscordRateLimiter()
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .constants import DEBUG_MODE, DISCORD_WEBHOOK_URL, DISCORD_ROUTES_FILE
+
+logger = logging.getLogger(__name__)
+
+# Atributos do alerta que não vêm das labels
+_ALERT_ATTRS = ('alert_type', 'severity', 'status')
+
+
+def mask_webhook(url: Optional[str]) -> str:
+    """Identificação do webhook sem o token (seguro para logs/endpoints)."""
+    if not url:
+        return 'none'
+    match = re.search(r'/webhooks/(\d+)', url)
+    if match:
+        return f"webhook:{match.group(1)}"
+    return url.split('?')[0].rsplit('/', 1)[0] + '/***'
+
+
+def _compile_value(value) -> Callable[[str], bool]:
+    """Compila o valor de um matcher: string, lista de strings ou 're:<regex>'."""
+    values = value if isinstance(value, list) else [value]
+    exact = set()
+    patterns = []
+    for v in values:
+        v = str(v)
+        if v.startswith('re:'):
+            patterns.append(v[3:])
+        else:
+            exact.add(v.strip().lower())
+    regex = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE) if patterns else None
+
+    def _match(actual: str) -> bool:
+        if actual in exact:
+            return True
+        return bool(regex and regex.fullmatch(actual))
+
+    return _match
+
+
+def _resolve_webhook(value) -> Optional[str]:
+    # 'env:NOME' lê a URL de uma variável de ambiente (mantém o token fora do arquivo)
+    value = str(value or '').strip()
+    if value.startswith('env:'):
+        return os.getenv(value[4:]) or None
+    return value or None
+
+
+class _Route:
+    __slots__ = ('name', 'matchers', 'webhooks', 'cont')
+
+    def __init__(self, name: str, matchers: List[Tuple[str, Callable[[str], bool]]], webhooks: List[str], cont: bool):
+        self.name = name
+        self.matchers = matchers
+        self.webhooks = webhooks
+        self.cont = cont
+
+
+class DiscordRouter:
+    """
+    Tabela de roteamento label -> webhooks do Discord, compilada no startup.
+
+    Arquivo JSON (DISCORD_ROUTES_FILE):
+        {"routes": [
+            {"name": "containers-prod",
+             "match": {"alert_type": "container", "environment": ["prod", "production"]},
+             "webhooks": ["env:DISCORD_WEBHOOK_CONTAINERS_PROD"]},
+            {"name": "oncall", "match": {"severity": ["high", "container_down"]},
+             "webhooks": ["https://discord.com/api/webhooks/..."], "continue": true}
+        ]}
+
+    As rotas são avaliadas em ordem numa única passada. Uma rota que casa adiciona
+    seus webhooks e encerra a avaliação, exceto com "continue": true (aditiva).
+    Se nenhuma rota terminal casar, o alerta também vai para DISCORD_WEBHOOK_URL.
+    """
+
+    def __init__(self, routes_file: Optional[str] = DISCORD_ROUTES_FILE, default_webhook: Optional[str] = DISCORD_WEBHOOK_URL):
+        self.default_webhook = default_webhook
+        self.routes: List[_Route] = self._load(routes_file)
+
+    def _load(self, routes_file: Optional[str]) -> List[_Route]:
+        if not routes_file:
+            return []
+        try:
+            with open(routes_file, 'r', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            logger.warning(f"Arquivo de rotas do Discord não encontrado: {routes_file}")
+            return []
+        except Exception as exc:
+            logger.warning(f"Falha ao carregar rotas do Discord ({routes_file}): {exc}")
+            return []
+
+        raw_routes = data.get('routes', []) if isinstance(data, dict) else data
+        routes: List[_Route] = []
+        for idx, raw in enumerate(raw_routes or []):
+            if not isinstance(raw, dict):
+                continue
+            name = str(raw.get('name') or f"route-{idx}")
+            matchers = [(str(k), _compile_value(v)) for k, v in (raw.get('match') or {}).items()]
+            webhooks = [w for w in (_resolve_webhook(v) for v in (raw.get('webhooks') or [])) if w]
+            if not webhooks:
+                logger.warning(f"Rota do Discord '{name}' sem webhooks válidos; ignorada")
+                continue
+            routes.append(_Route(name, matchers, webhooks, bool(raw.get('continue', False))))
+        if DEBUG_MODE:
+            print(f"[DEBUG] Rotas do Discord carregadas: {[r.name for r in routes]}")
+        return routes
+
+    def route(self, alert_type: Optional[str], severity: Optional[str], labels: Optional[Dict] = None,
+              status: Optional[str] = None) -> List[str]:
+        """Retorna os webhooks de destino (sem repetição, na ordem das rotas)."""
+        if not self.routes:
+            return [self.default_webhook] if self.default_webhook else []
+
+        attrs = {'alert_type': alert_type, 'severity': severity, 'status': status}
+        labels = labels or {}
+        result: List[str] = []
+        terminal = False
+        for route in self.routes:
+            matched = True
+            for key, match in route.matchers:
+                actual = attrs.get(key) if key in _ALERT_ATTRS else labels.get(key)
+                if actual is None or not match(str(actual).strip().lower()):
+                    matched = False
+                    break
+            if not matched:
+                continue
+            for url in route.webhooks:
+                if url not in result:
+                    result.append(url)
+            if not route.cont:
+                terminal = True
+                break
+
+        if not terminal and self.default_webhook and self.default_webhook not in result:
+            result.append(self.default_webhook)
+        return result
+
+
+discord_router = DiscordRouter()
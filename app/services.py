@@ -1,15 +1,111 @@
+import threading
+from typing import Optional
+
 import requests
-from .constants import DISCORD_WEBHOOK_URL, DEBUG_MODE
 
+from .constants import (
+    DISCORD_WEBHOOK_URL,
+    DEBUG_MODE,
+    DISCORD_POOL_SIZE,
+    DISCORD_CONNECT_TIMEOUT_SECONDS,
+    DISCORD_READ_TIMEOUT_SECONDS,
+    DISCORD_RATE_LIMIT_MAX_RETRIES,
+    DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS,
+)
+from .circuit import CircuitOpenError, discord_breakers
+from .http_pool import build_pooled_session
+from .metrics import DISCORD_REQUEST_SECONDS, DISCORD_RESPONSES
+from .ratelimit import discord_rate_limiter
+
+
+class DiscordSessionPool:
+    """
+    Sessão HTTP compartilhada (keep-alive) para envio aos webhooks do Discord.
+    Evita um novo handshake TCP/TLS a cada mensagem; segura para uso por
+    múltiplas threads (request handlers e PortainerMonitor).
+    """
+
+    def __init__(self, pool_size: int = DISCORD_POOL_SIZE,
+                 connect_timeout: float = DISCORD_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout: float = DISCORD_READ_TIMEOUT_SECONDS):
+        self.pool_size = max(1, pool_size)
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+
+    def _get_session(self) -> requests.Session:
+        session = self._session
+        if session is not None:
+            return session
+        with self._lock:
+            if self._session is None:
+                self._session = build_pooled_session(self.pool_size, self.pool_size)
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Discord session pool criado (pool_size={self.pool_size}, timeout={self.timeout})")
+            return self._session
+
+    def post(self, url: str, payload: dict) -> requests.Response:
+        return self._get_session().post(url, json=payload, timeout=self.timeout)
 
-def send_discord_payload(content=None, embeds=None):
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+discord_pool = DiscordSessionPool()
+
+
+def send_discord_payload(content=None, embeds=None, webhook_url=None):
     payload = {}
     if content is not None:
         payload["content"] = content
     if embeds is not None:
         payload["embeds"] = embeds
 
-    resp = requests.post(DISCORD_WEBHOOK_URL, json=payload)
+    url = webhook_url or DISCORD_WEBHOOK_URL
+    breaker = discord_breakers.get(url)
+    # Circuito aberto: falha imediatamente, sem tocar a rede (quem chama bufferiza)
+    if not breaker.allow():
+        raise CircuitOpenError(breaker.retry_in())
+    # O resultado vai para o breaker num único ponto (finally): qualquer exceção conta
+    # como falha, inclusive as que não são de rede; senão a prova do half_open ficaria
+    # marcada como em andamento para sempre e o circuito nunca mais fecharia
+    resp = None
+    error = None
+    attempt = 0
+    try:
+        while True:
+            # Respeita o bucket do webhook antes de enviar (evita o 429)
+            discord_rate_limiter.acquire(url)
+            try:
+                with DISCORD_REQUEST_SECONDS.time():
+                    resp = discord_pool.post(url, payload)
+            except requests.RequestException:
+                DISCORD_RESPONSES.inc(status='error')
+                raise
+            DISCORD_RESPONSES.inc(status=str(resp.status_code))
+            retry_after = discord_rate_limiter.update(url, resp)
+            if retry_after is None:
+                break
+            if attempt >= DISCORD_RATE_LIMIT_MAX_RETRIES or retry_after > DISCORD_RATE_LIMIT_MAX_WAIT_SECONDS:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Discord 429: desistindo após {attempt} tentativas (retry_after={retry_after}s)")
+                break
+            attempt += 1
+            if DEBUG_MODE:
+                print(f"[DEBUG] Discord 429: reenviando em {retry_after}s (tentativa {attempt}/{DISCORD_RATE_LIMIT_MAX_RETRIES})")
+    except Exception as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        if error is None and resp is not None and resp.status_code < 500:
+            # 2xx; 4xx / 429 esgotado também: o webhook respondeu, não é indisponibilidade
+            breaker.record_success()
+        else:
+            breaker.record_failure(error or (f"HTTP {resp.status_code}" if resp is not None else 'interrompido'))
+
     if DEBUG_MODE:
         try:
             print(f"[DEBUG] Discord response: {resp.status_code}")
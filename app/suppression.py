@@ -1,20 +1,20 @@
+import heapq
 import time
 import re
+import threading
 import logging
-import json
-import os
-from typing import Dict, Optional, Tuple, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 from .constants import (
     CONTAINER_SUPPRESS_REPEATS,
     CONTAINER_SUPPRESS_TTL_SECONDS,
     CONTAINER_SUPPRESS_PERSIST,
     CONTAINER_SUPPRESS_STATE_FILE,
-    CONTAINER_PAUSED_ALLOWLIST,
-    CONTAINER_ALWAYS_NOTIFY_ALLOWLIST,
-    CONTAINER_IGNORE_ALLOWLIST,
     BLUE_GREEN_SUPPRESSION_ENABLED,
 )
+from .metrics import SUPPRESSION_DECISIONS
+from .allowlist import container_allowlist, IGNORE, ALWAYS_NOTIFY, PAUSED
+from .suppression_persist import SnapshotPersister, build_persister
 
 if TYPE_CHECKING:
     from .portainer import PortainerClient
@@ -146,8 +146,8 @@ def find_active_sibling(container_name: str, endpoint_id: Optional[int], portain
     logger.debug(f"Procurando sibling '{sibling_name}' para container '{container_name}' no endpoint {endpoint_id}")
     
     try:
-        # Listar todos os containers do endpoint
-        containers = portainer_client.list_containers(endpoint_id, all=True)
+        # Só o sibling: filtro por nome no Docker (ou no snapshot em cache)
+        containers = portainer_client.find_containers_by_name(endpoint_id, [sibling_name])
         
         # Procurar o sibling e verificar seu estado
         for container in containers:
@@ -182,9 +182,23 @@ class ContainerSuppressor:
     - Suprime os seguintes enquanto não voltar a 'running'
     - Ao ver 'running', reseta supressão
     - 'paused' é ignorado se o container estiver na allowlist
+
+    Expiração por TTL: cada escrita empilha (expira_em, chave) num min-heap; no início
+    de cada decisão só o topo vencido é retirado (entradas reescritas depois ficam
+    obsoletas no heap e são ignoradas). Assim a decisão não varre o estado inteiro e
+    as chaves expiradas vão em lote para o persister.
+
+    Uma única instância por processo (`container_suppressor`) atende o /alert e o
+    PortainerMonitor. O lock é por faixa de chaves (striped): decisões de containers
+    diferentes não se bloqueiam; o heap de expiração tem lock próprio. resolve_key()
+    concilia a chave por nome (Grafana) com a chave por ID (Portainer), para que um
+    container tenha um único registro de estado.
     """
 
     FAILURE_STATES = {'down', 'restarting', 'exited', 'dead', 'unknown', 'stopped', 'created'}
+    LOCK_STRIPES = 64
+    # Limite do índice ID -> nome (IDs mudam a cada recriação do container)
+    ALIAS_MAX = 50000
 
     def __init__(self, ttl_seconds: int = CONTAINER_SUPPRESS_TTL_SECONDS, enabled: bool = CONTAINER_SUPPRESS_REPEATS, 
                  persist: bool = CONTAINER_SUPPRESS_PERSIST, state_file: str = CONTAINER_SUPPRESS_STATE_FILE):
@@ -193,59 +207,163 @@ class ContainerSuppressor:
         self.persist = persist
         self.state_file = state_file
         self._store: Dict[str, Dict] = {}
-        
+        # (expira_em, chave) para a expiração preguiçosa por TTL
+        self._expiry: List[Tuple[float, str]] = []
+        # Acessado pelas threads do servidor e pelo PortainerMonitor ao mesmo tempo:
+        # um lock por faixa de chaves + um para o heap (nunca pego antes de uma faixa)
+        self._stripes = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._expiry_lock = threading.Lock()
+        # chave por ID (build_container_key_by_id) -> chave por nome (build_container_key)
+        self._aliases: Dict[str, str] = {}
+        self._alias_lock = threading.Lock()
+        # Gravação write-behind: as mudanças só marcam a chave como suja
+        self._persister: Optional[SnapshotPersister] = None
+
         # Carrega estado persistido (se habilitado)
         if self.persist:
+            self._persister = build_persister(self.state_file, self._snapshot, self.ttl)
             self._load_state()
+            self._persister.start()
+
+    def _stripe(self, key: str) -> threading.Lock:
+        return self._stripes[hash(key) % self.LOCK_STRIPES]
+
+    def _snapshot(self) -> Dict[str, Dict]:
+        return {k: dict(v) for k, v in list(self._store.items())}
 
     def _load_state(self):
         """Carrega estado de supressão de arquivo JSON."""
-        if not os.path.exists(self.state_file):
-            return
-        
         try:
-            with open(self.state_file, 'r') as f:
-                data = json.load(f)
-                # Carrega apenas entradas ainda válidas (dentro do TTL)
-                now = time.time()
-                for key, entry in data.items():
-                    if isinstance(entry, dict) and 'ts' in entry:
-                        if (now - entry.get('ts', now)) <= self.ttl:
-                            self._store[key] = entry
-                
+            data = self._persister.load()
+            # Carrega apenas entradas ainda válidas (dentro do TTL)
+            now = time.time()
+            for key, entry in data.items():
+                if isinstance(entry, dict) and 'ts' in entry:
+                    if (now - entry.get('ts', now)) <= self.ttl:
+                        self._store[key] = entry
+            self._expiry = [(entry['ts'] + self.ttl, key) for key, entry in self._store.items()]
+            heapq.heapify(self._expiry)
+            if data:
                 logger.info(f"Estado de supressão carregado: {len(self._store)} containers suprimidos")
         except Exception as e:
             logger.warning(f"Falha ao carregar estado de supressão: {e}")
 
-    def _save_state(self):
-        """Salva estado de supressão em arquivo JSON."""
-        if not self.persist:
-            return
-        
-        try:
-            # Garante que o diretório existe
-            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
-            
-            with open(self.state_file, 'w') as f:
-                json.dump(self._store, f, indent=2)
-        except Exception as e:
-            logger.warning(f"Falha ao salvar estado de supressão: {e}")
+    def _save_state(self, key: str):
+        """Marca `key` para a próxima gravação do estado (write-behind)."""
+        if self._persister is not None:
+            self._persister.record(key, self._store.get(key))
+
+    def flush(self):
+        """Grava imediatamente o estado pendente (ex.: shutdown)."""
+        if self._persister is not None:
+            self._persister.flush()
+
+    def _set(self, key: str, entry: Dict):
+        """Grava a entrada e agenda sua expiração (chamado com a faixa da chave)."""
+        self._store[key] = entry
+        with self._expiry_lock:
+            heapq.heappush(self._expiry, (entry['ts'] + self.ttl, key))
+            # Cada escrita empilha um item; refaz o heap quando os obsoletos dominam
+            if len(self._expiry) > 2 * len(self._store) + 1024:
+                self._expiry = [(v['ts'] + self.ttl, k) for k, v in list(self._store.items())]
+                heapq.heapify(self._expiry)
 
     def _cleanup(self):
         now = time.time()
-        to_delete = []
-        for k, v in self._store.items():
-            if (now - v.get('ts', now)) > self.ttl:
-                to_delete.append(k)
-        for k in to_delete:
-            self._store.pop(k, None)
-        
-        # Salva estado após limpeza (se habilitado)
-        if to_delete and self.persist:
-            self._save_state()
+        candidates = []
+        with self._expiry_lock:
+            expiry = self._expiry
+            while expiry and expiry[0][0] < now:
+                candidates.append(heapq.heappop(expiry)[1])
+        if not candidates:
+            return
+        expired = []
+        for k in candidates:
+            with self._stripe(k):
+                entry = self._store.get(k)
+                # Item obsoleto: a chave foi reescrita depois (ts mais novo) ou já saiu
+                if entry is not None and (now - entry.get('ts', now)) > self.ttl:
+                    del self._store[k]
+                    expired.append(k)
+        if expired and self._persister is not None:
+            self._persister.record_expired(expired)
+
+    def suppressed(self, state: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Containers com supressão ativa (mais recentes primeiro). No backend SQLite a
+        consulta vai ao banco pelo índice; nos demais, filtra o estado em memória.
+        """
+        query = getattr(self._persister, 'suppressed', None)
+        if query is not None:
+            rows = query(state=state, limit=limit)
+            # None: banco indisponível no momento, responde pelo estado em memória
+            if rows is not None:
+                return rows
+        now = time.time()
+        rows = [
+            {'key': k, 'state': v.get('last'), 'ts': v.get('ts')}
+            for k, v in list(self._store.items())
+            if v.get('suppressed') and (state is None or v.get('last') == state) and (now - v.get('ts', now)) <= self.ttl
+        ]
+        rows.sort(key=lambda row: row['ts'], reverse=True)
+        return rows[:limit]
+
+    def pending_writes(self) -> Optional[int]:
+        """Mudanças ainda não gravadas no backend SQLite (None nos demais backends)."""
+        counter = getattr(self._persister, 'pending_count', None)
+        return counter() if counter is not None else None
+
+    def resolve_key(self, host: Optional[str], container_name: Optional[str] = None,
+                    container_id: Optional[str] = None, labels: Optional[Dict] = None) -> str:
+        """
+        Chave de estado única para o container, venha o alerta do Grafana (nome nas
+        labels) ou do PortainerMonitor (ID + nome).
+
+        A chave canônica é a por nome (build_container_key). Quando ID e nome aparecem
+        juntos, o par entra no índice ID -> nome, e um estado antigo gravado pela chave
+        de ID é migrado para a chave por nome. Só com o ID, usa o nome já conhecido.
+        """
+        name_key = None
+        if labels or container_name:
+            name_key = build_container_key(host, labels or {'container': container_name})
+            if name_key.endswith('|unknown'):
+                name_key = None
+        if not container_id:
+            return name_key or build_container_key(host, labels or {})
+        id_key = build_container_key_by_id(host, container_id)
+        if name_key is None:
+            return self._aliases.get(id_key, id_key)
+
+        with self._alias_lock:
+            if self._aliases.get(id_key) != name_key:
+                if len(self._aliases) >= self.ALIAS_MAX:
+                    self._aliases = {k: v for k, v in self._aliases.items() if v in self._store}
+                self._aliases[id_key] = name_key
+        if id_key in self._store:
+            self._migrate(id_key, name_key)
+        return name_key
+
+    def _migrate(self, old_key: str, new_key: str):
+        # Faixas sempre em ordem crescente para não haver deadlock entre migrações
+        stripes = sorted({hash(old_key) % self.LOCK_STRIPES, hash(new_key) % self.LOCK_STRIPES})
+        for index in stripes:
+            self._stripes[index].acquire()
+        try:
+            entry = self._store.pop(old_key, None)
+            if entry is None:
+                return
+            self._save_state(old_key)
+            current = self._store.get(new_key)
+            if current is None or current.get('ts', 0) < entry.get('ts', 0):
+                self._set(new_key, entry)
+                self._save_state(new_key)
+        finally:
+            for index in reversed(stripes):
+                self._stripes[index].release()
 
     def should_send(self, key: str, current_state: str, container_name: Optional[str] = None, 
-                    portainer_client: Optional['PortainerClient'] = None, endpoint_id: Optional[int] = None) -> Tuple[bool, str]:
+                    portainer_client: Optional['PortainerClient'] = None, endpoint_id: Optional[int] = None,
+                    sibling_status: Optional[Tuple[bool, Optional[str]]] = None) -> Tuple[bool, str]:
         """
         Retorna (deve_enviar, motivo). Quando suprime, motivo explica.
         
@@ -255,59 +373,88 @@ class ContainerSuppressor:
             container_name: Nome do container para verificações de allowlist e blue/green
             portainer_client: Cliente Portainer para verificar sibling blue/green
             endpoint_id: ID do endpoint Portainer onde o container está rodando
+            sibling_status: Resultado de find_active_sibling já consultado (ex.: verificação
+                paralela do payload); quando informado, o Portainer não é consultado de novo
         """
+        send, reason = self._decide(key, current_state, container_name, portainer_client, endpoint_id, sibling_status)
+        # Motivo sem o sufixo variável (ex.: nome do sibling) para não explodir a cardinalidade
+        SUPPRESSION_DECISIONS.inc(decision='sent' if send else 'suppressed', reason=reason.split(':', 1)[0])
+        return send, reason
+
+    def _decide(self, key: str, current_state: str, container_name: Optional[str],
+                portainer_client: Optional['PortainerClient'], endpoint_id: Optional[int],
+                sibling_status: Optional[Tuple[bool, Optional[str]]] = None) -> Tuple[bool, str]:
         self._cleanup()
         if not self.enabled:
             return True, 'feature_disabled'
 
-        name_norm = _normalize_name(container_name or '')
+        # Todas as allowlists numa consulta (nome exato, glob ou regex)
+        policies = container_allowlist.policies(container_name)
         # Containers completamente ignorados (sem alertas)
-        if name_norm in { _normalize_name(n) for n in CONTAINER_IGNORE_ALLOWLIST }:
+        if IGNORE in policies:
             return False, 'completely_ignored'
         # Containers no allowlist de "sempre notificar" nunca são suprimidos
-        if name_norm in { _normalize_name(n) for n in CONTAINER_ALWAYS_NOTIFY_ALLOWLIST }:
+        if ALWAYS_NOTIFY in policies:
             return True, 'always_notify_allowlisted'
         # Ignorar 'paused' quando na allowlist
-        if current_state == 'paused' and name_norm in { _normalize_name(n) for n in CONTAINER_PAUSED_ALLOWLIST }:
+        if current_state == 'paused' and PAUSED in policies:
             # Mantém registro mas não ativa supressão
-            self._store[key] = {'suppressed': False, 'last': 'paused', 'ts': time.time()}
-            self._save_state()
+            with self._stripe(key):
+                self._set(key, {'suppressed': False, 'last': 'paused', 'ts': time.time()})
+                self._save_state(key)
             return False, 'paused_allowlisted'
 
-        entry = self._store.get(key, {'suppressed': False, 'last': 'unknown', 'ts': 0})
-
         # Reset ao ver running
         if current_state == 'running':
-            self._store[key] = {'suppressed': False, 'last': 'running', 'ts': time.time()}
-            self._save_state()
+            with self._stripe(key):
+                previous = self._store.get(key)
+                self._set(key, {'suppressed': False, 'last': 'running', 'ts': time.time()})
+                # Container que já estava running: só renova o ts em memória. Sem a entrada
+                # no arquivo a decisão após restart é a mesma (não suprimido), então não há
+                # por que gravar a cada verificação de container saudável.
+                if not previous or previous.get('suppressed') or previous.get('last') != 'running':
+                    self._save_state(key)
             return False, 'reset_on_running'
 
         # Estados problemáticos
         if current_state in self.FAILURE_STATES:
             # VERIFICAÇÃO BLUE/GREEN: Se o sibling estiver ativo, suprimir alerta
-            if container_name and portainer_client and endpoint_id is not None:
+            # (consulta ao Portainer fora do lock para não serializar as requisições)
+            sibling_active, sibling_name = False, None
+            if sibling_status is not None:
+                sibling_active, sibling_name = sibling_status
+            elif container_name and portainer_client and endpoint_id is not None:
                 sibling_active, sibling_name = find_active_sibling(container_name, endpoint_id, portainer_client)
+
+            with self._stripe(key):
+                entry = self._store.get(key, {'suppressed': False, 'last': 'unknown', 'ts': 0})
                 if sibling_active and sibling_name:
                     logger.info(f"Suprimindo alerta de '{container_name}': sibling '{sibling_name}' está ativo (blue/green deployment)")
                     # Atualizar estado mas não ativar supressão (para permitir alerta se ambos caírem)
                     entry.update({'last': current_state, 'ts': time.time(), 'suppressed': False})
-                    self._store[key] = entry
-                    self._save_state()
+                    self._set(key, entry)
+                    self._save_state(key)
                     return False, f'blue_green_sibling_active:{sibling_name}'
-            
-            if entry.get('suppressed'):
-                # já alertou antes e não voltou a running
-                entry.update({'last': current_state, 'ts': time.time()})
-                self._store[key] = entry
-                self._save_state()
-                return False, 'already_suppressed_until_running'
-            # primeira falha desde último running -> envia e ativa supressão
-            self._store[key] = {'suppressed': True, 'last': current_state, 'ts': time.time()}
-            self._save_state()
-            return True, 'first_failure_since_running'
+
+                if entry.get('suppressed'):
+                    # já alertou antes e não voltou a running
+                    entry.update({'last': current_state, 'ts': time.time()})
+                    self._set(key, entry)
+                    self._save_state(key)
+                    return False, 'already_suppressed_until_running'
+                # primeira falha desde último running -> envia e ativa supressão
+                self._set(key, {'suppressed': True, 'last': current_state, 'ts': time.time()})
+                self._save_state(key)
+                return True, 'first_failure_since_running'
 
         # Outros estados desconhecidos: não envia por padrão
-        entry.update({'last': current_state, 'ts': time.time()})
-        self._store[key] = entry
-        self._save_state()
+        with self._stripe(key):
+            entry = self._store.get(key, {'suppressed': False, 'last': 'unknown', 'ts': 0})
+            entry.update({'last': current_state, 'ts': time.time()})
+            self._set(key, entry)
+            self._save_state(key)
         return False, 'non_failure_state'
+
+
+# Instância única do processo, compartilhada pelo /alert e pelo PortainerMonitor
+container_suppressor = ContainerSuppressor()
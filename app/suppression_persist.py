@@ -0,0 +1,292 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .constants import (
+    DEBUG_MODE,
+    CONTAINER_SUPPRESS_FLUSH_INTERVAL_MS,
+    CONTAINER_SUPPRESS_FLUSH_MAX_DIRTY,
+    CONTAINER_SUPPRESS_PERSIST_MODE,
+    CONTAINER_SUPPRESS_JOURNAL_MAX_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_atomic(path: str, data: Dict):
+    """Grava num arquivo temporário no mesmo diretório e troca com os.replace (atômico)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _split_snapshot(data) -> Tuple[Dict[str, Dict], int]:
+    """Snapshot em disco -> (estado, seq). Aceita o formato antigo (só o dict do estado)."""
+    if not isinstance(data, dict):
+        return {}, 0
+    if isinstance(data.get('state'), dict) and isinstance(data.get('seq'), int):
+        return data['state'], data['seq']
+    return data, 0
+
+
+class SnapshotPersister:
+    """
+    Persistência write-behind do estado do ContainerSuppressor num arquivo JSON.
+
+    record() só marca a chave como suja (O(1), sem I/O no caminho do alerta). Uma thread
+    grava o snapshot completo quando passa o intervalo de debounce desde a primeira
+    mudança pendente, ou antes disso se o número de chaves sujas chegar ao limite.
+    A gravação é atômica (arquivo temporário + rename), então um crash no meio da escrita
+    nunca deixa o arquivo truncado. close() (atexit) grava o que estiver pendente.
+    """
+
+    def __init__(self, state_file: str, snapshot: Callable[[], Dict],
+                 flush_interval_ms: int = CONTAINER_SUPPRESS_FLUSH_INTERVAL_MS,
+                 max_dirty: int = CONTAINER_SUPPRESS_FLUSH_MAX_DIRTY):
+        self.state_file = state_file
+        self._snapshot = snapshot
+        self.flush_interval = max(10, flush_interval_ms) / 1000.0
+        self.max_dirty = max(1, max_dirty)
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Sinaliza que as chaves sujas chegaram ao limite (interrompe o debounce)
+        self._full = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r') as f:
+            data = json.load(f)
+        return _split_snapshot(data)[0]
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="suppression-persist", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, key: str, entry: Optional[Dict]):
+        """Registra que `key` mudou (entry=None: removida). Não faz I/O."""
+        self.record_many([(key, entry)])
+
+    def record_many(self, changes: List[Tuple[str, Optional[Dict]]]):
+        """Registra várias mudanças de uma vez (ex.: lote de chaves expiradas)."""
+        if not changes:
+            return
+        with self._lock:
+            first = not self._dirty
+            self._dirty.update(key for key, _ in changes)
+            full = len(self._dirty) >= self.max_dirty
+        self._notify(first, full)
+
+    def _notify(self, first: bool, full: bool):
+        """Acorda a thread na primeira mudança pendente e encerra o debounce ao atingir o limite."""
+        if full:
+            self._full.set()
+        if first or full:
+            self._wakeup.set()
+
+    def record_expired(self, keys: List[str]):
+        """Chaves removidas por TTL (em lote, a partir do heap de expiração)."""
+        self.record_many([(key, None) for key in keys])
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            # Debounce: agrupa as mudanças do intervalo, mas grava assim que o número de
+            # chaves sujas atingir o limite (mesmo no meio da espera)
+            self._full.wait(self.flush_interval)
+            self._full.clear()
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                dirty, self._dirty = self._dirty, set()
+            try:
+                write_json_atomic(self.state_file, self._snapshot())
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Supressão: estado gravado ({len(dirty)} chaves alteradas)")
+            except Exception as e:
+                logger.warning(f"Falha ao salvar estado de supressão: {e}")
+                # Mantém as chaves como sujas para a próxima tentativa
+                with self._lock:
+                    self._dirty |= dirty
+
+    def close(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._full.set()
+        self.flush()
+
+
+class JournalPersister(SnapshotPersister):
+    """
+    Variante em journal: cada mudança vira uma linha JSON ({"k": chave, "e": entrada ou
+    null, "s": seq}) acrescentada a `<state_file>.journal`, em vez de regravar o estado
+    inteiro. `seq` cresce a cada mudança e nunca volta (continua após o restart).
+
+    - load(): lê o último snapshot (`state_file`) e reaplica o journal por cima; uma
+      linha final truncada (crash no meio do append) é ignorada.
+    - As linhas pendentes são gravadas em lote pela mesma thread de debounce.
+    - Compactação: quando o journal passa de `max_journal_bytes`, a thread grava um novo
+      snapshot (temporário + rename) com o seq do último registro já gravado e depois
+      zera o journal. Na carga, registros com seq menor ou igual ao do snapshot são
+      ignorados: um crash entre as duas etapas (ou no meio do truncamento) não reaplica o
+      journal antigo sobre o snapshot mais novo.
+    """
+
+    def __init__(self, state_file: str, snapshot: Callable[[], Dict],
+                 flush_interval_ms: int = CONTAINER_SUPPRESS_FLUSH_INTERVAL_MS,
+                 max_dirty: int = CONTAINER_SUPPRESS_FLUSH_MAX_DIRTY,
+                 max_journal_bytes: int = CONTAINER_SUPPRESS_JOURNAL_MAX_BYTES):
+        super().__init__(state_file, snapshot, flush_interval_ms=flush_interval_ms, max_dirty=max_dirty)
+        self.journal_file = f"{state_file}.journal"
+        self.max_journal_bytes = max(1024, max_journal_bytes)
+        self._pending: List[Tuple[str, Optional[Dict], int]] = []
+        self._journal = None
+        self._journal_bytes = 0
+        self._seq = 0  # último seq atribuído
+        self._written_seq = 0  # último seq gravado no journal
+
+    def load(self) -> Dict[str, Dict]:
+        data: Dict[str, Dict] = {}
+        snapshot_seq = 0
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                data, snapshot_seq = _split_snapshot(json.load(f))
+        last_seq = snapshot_seq
+        if not os.path.exists(self.journal_file):
+            self._seq = self._written_seq = last_seq
+            return data
+        replayed = skipped = 0
+        with open(self.journal_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Journal de supressão: linha inválida ignorada em {self.journal_file}")
+                    continue
+                key, entry = record.get('k'), record.get('e')
+                if key is None:
+                    continue
+                seq = record.get('s') or 0
+                last_seq = max(last_seq, seq)
+                # Já contido no snapshot (journal não zerado antes de um crash)
+                if snapshot_seq and seq <= snapshot_seq:
+                    skipped += 1
+                    continue
+                if entry is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = entry
+                replayed += 1
+        self._seq = self._written_seq = last_seq
+        if DEBUG_MODE:
+            print(f"[DEBUG] Supressão: {replayed} registros do journal reaplicados sobre o snapshot ({skipped} já contidos nele)")
+        return data
+
+    def record_many(self, changes: List[Tuple[str, Optional[Dict]]]):
+        if not changes:
+            return
+        with self._lock:
+            first = not self._pending
+            for key, entry in changes:
+                self._seq += 1
+                self._pending.append((key, dict(entry) if entry is not None else None, self._seq))
+            full = len(self._pending) >= self.max_dirty
+        self._notify(first, full)
+
+    def _open_journal(self):
+        directory = os.path.dirname(self.journal_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._journal = open(self.journal_file, 'a')
+        self._journal_bytes = self._journal.tell()
+        if self._journal_bytes:
+            # Linha final truncada (crash no meio do append): fecha antes de continuar
+            with open(self.journal_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._journal.write('\n')
+                    self._journal_bytes += 1
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                pending, self._pending = self._pending, []
+            try:
+                if self._journal is None:
+                    self._open_journal()
+                chunk = ''.join(json.dumps({'k': k, 'e': e, 's': seq}, separators=(',', ':')) + '\n' for k, e, seq in pending)
+                self._journal.write(chunk)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal_bytes += len(chunk)
+                self._written_seq = pending[-1][2]
+            except Exception as e:
+                logger.warning(f"Falha ao gravar journal de supressão: {e}")
+                with self._lock:
+                    self._pending[:0] = pending
+                return
+            if self._journal_bytes >= self.max_journal_bytes and not self._stop.is_set():
+                self._compact_locked()
+
+    def _compact_locked(self):
+        """Grava o snapshot atual e zera o journal (chamado com _write_lock)."""
+        try:
+            # O snapshot já contém tudo o que foi para o journal (o estado em memória
+            # é atualizado antes do record); pendentes posteriores vão para o novo journal
+            # com seq maior que o gravado aqui
+            write_json_atomic(self.state_file, {'seq': self._written_seq, 'state': self._snapshot()})
+            self._journal.close()
+            self._journal = open(self.journal_file, 'w')
+            previous, self._journal_bytes = self._journal_bytes, 0
+            if DEBUG_MODE:
+                print(f"[DEBUG] Supressão: journal compactado ({previous} bytes)")
+        except Exception as e:
+            logger.warning(f"Falha ao compactar journal de supressão: {e}")
+
+    def close(self):
+        super().close()
+        with self._write_lock:
+            if self._journal is not None:
+                try:
+                    self._journal.close()
+                except Exception:
+                    pass
+                self._journal = None
+
+
+def build_persister(state_file: str, snapshot: Callable[[], Dict], ttl_seconds: int,
+                    mode: str = CONTAINER_SUPPRESS_PERSIST_MODE) -> SnapshotPersister:
+    """Persistência do estado de supressão conforme CONTAINER_SUPPRESS_PERSIST_MODE (snapshot|journal|sqlite)."""
+    if mode == 'sqlite':
+        from .suppression_sqlite import SQLitePersister
+        return SQLitePersister(state_file, snapshot, ttl_seconds)
+    if mode == 'journal':
+        return JournalPersister(state_file, snapshot)
+    if mode != 'snapshot':
+        logger.warning(f"CONTAINER_SUPPRESS_PERSIST_MODE desconhecido '{mode}', usando snapshot")
+    return SnapshotPersister(state_file, snapshot)
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .constants import DEBUG_MODE, CONTAINER_SUPPRESS_DB_FILE
+from .suppression_persist import SnapshotPersister
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersister(SnapshotPersister):
+    """
+    Estado do ContainerSuppressor num SQLite local (modo WAL) no lugar do arquivo JSON.
+
+    - Tabela `suppression(key, suppressed, state, ts, data)`: chave primária em `key` e
+      índices em (suppressed, state) e em ts.
+    - As mudanças continuam write-behind: ficam pendentes (última versão por chave) e a
+      thread do SnapshotPersister grava o lote numa transação.
+    - Expiração por TTL: em vez de uma remoção por chave, o lote executa um único
+      DELETE por faixa de ts (usa o índice).
+    - suppressed() consulta os containers suprimidos direto no banco, sem carregar o
+      estado inteiro e sem gravar: responde com o que já foi gravado, e pending_count()
+      informa quantas mudanças ainda aguardam o próximo flush.
+    Na primeira abertura com o banco vazio, importa o arquivo JSON antigo (se existir).
+
+    Se o banco não abrir, o estado segue só em memória (um aviso) e a abertura é tentada
+    de novo a cada REOPEN_SECONDS nos flushes; as pendências ficam limitadas a
+    PENDING_MAX chaves (as excedentes são descartadas) e, quando o banco volta, o estado
+    em memória inteiro é regravado.
+    """
+
+    PENDING_MAX = 50000
+    REOPEN_SECONDS = 30.0
+
+    def __init__(self, state_file: str, snapshot: Callable[[], Dict], ttl_seconds: int,
+                 db_path: str = CONTAINER_SUPPRESS_DB_FILE, **kwargs):
+        super().__init__(state_file, snapshot, **kwargs)
+        self.db_path = db_path
+        self.ttl = ttl_seconds
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._expire_pending = False
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Regrava o estado inteiro no próximo flush (banco reaberto ou pendências descartadas)
+        self._resync = False
+        self._reopen_at = 0.0
+        self._overflow_logged = False
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS suppression ("
+            "key TEXT PRIMARY KEY, suppressed INTEGER NOT NULL, state TEXT, ts REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS suppression_state ON suppression (suppressed, state)")
+        db.execute("CREATE INDEX IF NOT EXISTS suppression_ts ON suppression (ts)")
+        return db
+
+    def load(self) -> Dict[str, Dict]:
+        try:
+            self._db = self._open()
+        except Exception as exc:
+            logger.warning(
+                f"Falha ao abrir SQLite de supressão {self.db_path}: {exc}; estado só em memória, "
+                f"nova tentativa a cada {self.REOPEN_SECONDS:.0f}s"
+            )
+            self._reopen_at = time.monotonic() + self.REOPEN_SECONDS
+            self._resync = True
+            # Sem banco: parte do JSON antigo, se existir
+            try:
+                return super().load()
+            except Exception:
+                return {}
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT key, data FROM suppression WHERE ts >= ?", (time.time() - self.ttl,)
+            ).fetchall()
+        data: Dict[str, Dict] = {}
+        for key, raw in rows:
+            try:
+                data[key] = json.loads(raw)
+            except ValueError:
+                continue
+        if not data:
+            # Migração: banco novo, estado ainda no JSON do modo snapshot
+            try:
+                legacy = super().load()
+            except Exception as exc:
+                logger.warning(f"Falha ao importar estado de supressão de {self.state_file}: {exc}")
+                legacy = {}
+            if legacy:
+                self.record_many(list(legacy.items()))
+                logger.info(f"Estado de supressão importado de {self.state_file} para {self.db_path}")
+                data = legacy
+        if DEBUG_MODE:
+            print(f"[DEBUG] Supressão SQLite aberta: {self.db_path} ({len(data)} containers)")
+        return data
+
+    def record_many(self, changes: List[Tuple[str, Optional[Dict]]]):
+        if not changes:
+            return
+        with self._lock:
+            first = not self._pending and not self._expire_pending
+            for key, entry in changes:
+                if key not in self._pending and len(self._pending) >= self.PENDING_MAX:
+                    # Banco fora há tempo demais: descarta e regrava tudo quando voltar
+                    self._resync = True
+                    if not self._overflow_logged:
+                        self._overflow_logged = True
+                        logger.warning(
+                            f"Supressão SQLite: mais de {self.PENDING_MAX} chaves pendentes; "
+                            f"excedentes descartadas até o banco voltar"
+                        )
+                    continue
+                self._pending[key] = dict(entry) if entry is not None else None
+            full = len(self._pending) >= self.max_dirty
+        self._notify(first, full)
+
+    def record_expired(self, keys: List[str]):
+        # Não remove chave a chave: o próximo lote faz um DELETE por faixa de ts
+        with self._lock:
+            first = not self._pending and not self._expire_pending
+            self._expire_pending = True
+        if first:
+            self._wakeup.set()
+
+    def _reopen(self) -> bool:
+        """Nova tentativa de abrir o banco (no máximo a cada REOPEN_SECONDS)."""
+        if time.monotonic() < self._reopen_at:
+            return False
+        try:
+            db = self._open()
+        except Exception as exc:
+            self._reopen_at = time.monotonic() + self.REOPEN_SECONDS
+            if DEBUG_MODE:
+                print(f"[DEBUG] Supressão SQLite: banco ainda indisponível: {exc}")
+            return False
+        with self._db_lock:
+            self._db = db
+        logger.info(f"SQLite de supressão reaberto: {self.db_path}; regravando o estado em memória")
+        return True
+
+    def flush(self):
+        with self._write_lock:
+            if self._db is None and not self._reopen():
+                return
+            with self._lock:
+                if not self._pending and not self._expire_pending and not self._resync:
+                    return
+                pending, self._pending = self._pending, {}
+                expire, self._expire_pending = self._expire_pending, False
+                resync, self._resync = self._resync, False
+                self._overflow_logged = False
+            if resync:
+                # Estado em memória é a referência: substitui o conteúdo do banco inteiro
+                pending = {key: dict(entry) for key, entry in self._snapshot().items()}
+            upserts = [
+                (key, 1 if entry.get('suppressed') else 0, entry.get('last'), entry.get('ts', 0),
+                 json.dumps(entry, separators=(',', ':')))
+                for key, entry in pending.items() if entry is not None
+            ]
+            deletes = [(key,) for key, entry in pending.items() if entry is None]
+            try:
+                with self._db_lock:
+                    self._db.execute("BEGIN")
+                    if resync:
+                        self._db.execute("DELETE FROM suppression")
+                    if upserts:
+                        self._db.executemany(
+                            "INSERT INTO suppression (key, suppressed, state, ts, data) VALUES (?, ?, ?, ?, ?) "
+                            "ON CONFLICT (key) DO UPDATE SET suppressed = excluded.suppressed, "
+                            "state = excluded.state, ts = excluded.ts, data = excluded.data",
+                            upserts,
+                        )
+                    if deletes:
+                        self._db.executemany("DELETE FROM suppression WHERE key = ?", deletes)
+                    if expire:
+                        self._db.execute("DELETE FROM suppression WHERE ts < ?", (time.time() - self.ttl,))
+                    self._db.execute("COMMIT")
+            except Exception as exc:
+                logger.warning(f"Falha ao gravar estado de supressão no SQLite ({len(pending)} chaves): {exc}")
+                try:
+                    with self._db_lock:
+                        self._db.execute("ROLLBACK")
+                except Exception:
+                    pass
+                with self._lock:
+                    if resync:
+                        self._resync = True
+                    else:
+                        for key, entry in pending.items():
+                            if key in self._pending or len(self._pending) < self.PENDING_MAX:
+                                self._pending.setdefault(key, entry)
+                            else:
+                                self._resync = True
+                    self._expire_pending = self._expire_pending or expire
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def suppressed(self, state: Optional[str] = None, limit: int = 100) -> Optional[List[Dict]]:
+        """
+        Containers suprimidos (mais recentes primeiro) já gravados, consultados pelo índice.
+        None sem banco ou com o banco aguardando a regravação completa (conteúdo defasado).
+        """
+        if self._db is None or self._resync:
+            return None
+        query = "SELECT key, state, ts FROM suppression WHERE suppressed = 1 AND ts >= ?"
+        params: list = [time.time() - self.ttl]
+        if state:
+            query += " AND state = ?"
+            params.append(state)
+        query += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+        try:
+            with self._db_lock:
+                rows = self._db.execute(query, params).fetchall()
+        except Exception as exc:
+            logger.warning(f"Falha ao consultar supressões no SQLite: {exc}")
+            return None
+        return [{'key': key, 'state': st, 'ts': ts} for key, st, ts in rows]
+
+    def close(self):
+        super().close()
+        with self._db_lock:
+            if self._db is not None:
+                try:
+                    self._db.close()
+                except Exception as exc:
+                    logger.warning(f"Falha ao fechar SQLite de supressão: {exc}")
+                self._db = None
@@ -0,0 +1,136 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .constants import (
+    DEBUG_MODE,
+    ALERT_THROTTLE_ENABLED,
+    ALERT_THROTTLE_BURST,
+    ALERT_THROTTLE_RATE_PER_MINUTE,
+    ALERT_THROTTLE_MAX_BUCKETS,
+    ALERT_THROTTLE_REPORT_INTERVAL_SECONDS,
+)
+from .metrics import ALERTS_THROTTLED
+
+logger = logging.getLogger(__name__)
+
+
+def throttle_host(labels: dict, enriched_info: dict) -> str:
+    """Mesmo host usado no fingerprint do dedupe (IP real > host limpo > instance, sem porta)."""
+    host = enriched_info.get('real_ip') or enriched_info.get('clean_host') or labels.get('instance')
+    return (host or 'unknown').split(':')[0]
+
+
+class AlertThrottle:
+    """
+    Token bucket por (host, tipo de alerta), consultado antes do dedupe por fingerprint
+    (um alerta descartado aqui não entra no cooldown); se o dedupe suprimir o alerta
+    depois, refund() devolve o token.
+
+    O cooldown do TTLCache é por fingerprint; um host instável gera vários fingerprints
+    distintos (CPU, memória, cada disco, cada container) e passaria todos. Aqui cada
+    (host, tipo) tem até `burst` envios imediatos e recupera `rate_per_minute` por minuto.
+    Alertas sem token são descartados e contados; o total é reportado no log a cada
+    ALERT_THROTTLE_REPORT_INTERVAL_SECONDS.
+
+    Os buckets ficam num OrderedDict em ordem de uso; acima de `max_buckets` os menos
+    usados saem primeiro (um bucket parado há tempo suficiente já estaria cheio).
+    """
+
+    def __init__(self, burst: int = ALERT_THROTTLE_BURST, rate_per_minute: float = ALERT_THROTTLE_RATE_PER_MINUTE,
+                 max_buckets: int = ALERT_THROTTLE_MAX_BUCKETS, enabled: bool = ALERT_THROTTLE_ENABLED,
+                 report_interval: int = ALERT_THROTTLE_REPORT_INTERVAL_SECONDS):
+        self.enabled = enabled
+        self.burst = max(1, burst)
+        self.rate = max(0.0, rate_per_minute) / 60.0  # tokens por segundo
+        self.max_buckets = max(1, max_buckets)
+        self.report_interval = max(1, report_interval)
+        # (host, tipo) -> [tokens, último refill (monotonic)]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._dropped: Dict[Tuple[str, str], int] = {}
+        self._dropped_total = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reporter: Optional[threading.Thread] = None
+
+    def allow(self, host: str, alert_type: str) -> bool:
+        """Consome um token do bucket (host, tipo); False = alerta deve ser descartado."""
+        if not self.enabled:
+            return True
+        key = (host or 'unknown', alert_type or 'default')
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return True
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+            self._dropped_total += 1
+        ALERTS_THROTTLED.inc(alert_type=key[1])
+        if DEBUG_MODE:
+            print(f"[DEBUG] THROTTLE: alerta descartado host={key[0]} tipo={key[1]}")
+        return False
+
+    def refund(self, host: str, alert_type: str):
+        """Devolve o token consumido por allow() de um alerta que acabou não sendo enviado."""
+        if not self.enabled:
+            return
+        key = (host or 'unknown', alert_type or 'default')
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(float(self.burst), bucket[0] + 1.0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'buckets': len(self._buckets),
+                'dropped_pending_report': sum(self._dropped.values()),
+                'dropped_total': self._dropped_total,
+            }
+
+    # ---- relatório periódico ----
+
+    def report(self):
+        """Loga os descartes desde o último relatório (top 5 por host/tipo) e zera a janela."""
+        with self._lock:
+            dropped, self._dropped = self._dropped, {}
+        if not dropped:
+            return
+        top = sorted(dropped.items(), key=lambda item: item[1], reverse=True)[:5]
+        detail = ', '.join(f"{host}/{alert_type}={count}" for (host, alert_type), count in top)
+        logger.warning(
+            f"Throttle de alertas: {sum(dropped.values())} descartados em {len(dropped)} host/tipo "
+            f"nos últimos {self.report_interval}s ({detail})"
+        )
+
+    def _report_loop(self):
+        while not self._stop.wait(self.report_interval):
+            self.report()
+
+    def start(self):
+        if not self.enabled or self._reporter is not None:
+            return
+        self._reporter = threading.Thread(target=self._report_loop, name="alert-throttle-report", daemon=True)
+        self._reporter.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self.report()
+
+
+alert_throttle = AlertThrottle()
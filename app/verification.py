@@ -0,0 +1,79 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from .constants import DEBUG_MODE, PORTAINER_VERIFY_WORKERS, PORTAINER_VERIFY_DEADLINE_SECONDS, PORTAINER_VERIFY_GRAFANA_ALERTS
+from .portainer import PortainerClient, portainer_client
+from .suppression import ContainerSuppressor, compute_state, find_active_sibling
+
+# (host, labels, container_name, alert_status, metric_value) de um alerta de container
+VerifyJob = Tuple[Optional[str], Dict, Optional[str], str, Optional[float]]
+
+
+def _host_key(host: Optional[str]) -> str:
+    return (host or '').split(':')[0].strip().lower()
+
+
+class PortainerVerifier:
+    """
+    Executa as consultas ao Portainer dos alertas de container de um payload em paralelo
+    (pool limitado), com um prazo único para o payload inteiro.
+
+    Só roda com PORTAINER_VERIFY_GRAFANA_ALERTS=true; por padrão o alerta do Grafana não
+    consulta o Portainer (portainer_result=None, sem endpoint nem sibling). Para cada
+    alerta: verify_container (até 3 chamadas), resolução do endpoint e, se o estado for
+    de falha, a busca do sibling blue/green. O resultado volta na ordem dos jobs; o que não
+    terminou dentro do prazo vem como None e o alerta segue sem Portainer (fail-open).
+    Alertas de um host que aparece uma única vez no payload usam a consulta filtrada por
+    nome; hosts repetidos compartilham o snapshot (uma listagem só, single-flight).
+    """
+
+    def __init__(self, client: PortainerClient = portainer_client, max_workers: int = PORTAINER_VERIFY_WORKERS,
+                 deadline_seconds: float = PORTAINER_VERIFY_DEADLINE_SECONDS,
+                 verify_state: bool = PORTAINER_VERIFY_GRAFANA_ALERTS):
+        self.client = client
+        self.deadline = max(0.1, deadline_seconds)
+        self.verify_state = verify_state
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="portainer-verify")
+
+    def _verify_one(self, host: Optional[str], labels: Dict, container_name: Optional[str], alert_status: str,
+                    metric_value: Optional[float] = None, server_filter: bool = True) -> Dict:
+        result = self.client.verify_container(host, labels, server_filter=server_filter)
+        endpoint_id = result.get('endpoint_id')
+        if endpoint_id is None and result.get('error') == 'endpoint_not_found':
+            return {'portainer_result': result, 'endpoint_id': None, 'sibling_status': None}
+        if endpoint_id is None:
+            endpoint_id = self.client.resolve_endpoint(host)
+        sibling_status = None
+        if container_name and endpoint_id is not None:
+            # Mesmo estado que o ContainerSuppressor calcula: sibling só importa em falha
+            if compute_state(result, metric_value, alert_status) in ContainerSuppressor.FAILURE_STATES:
+                sibling_status = find_active_sibling(container_name, endpoint_id, self.client)
+        return {'portainer_result': result, 'endpoint_id': endpoint_id, 'sibling_status': sibling_status}
+
+    def verify_many(self, jobs: List[VerifyJob]) -> List[Optional[Dict]]:
+        if not jobs or not self.verify_state or not self.client.enabled:
+            return [None] * len(jobs)
+        per_host = Counter(_host_key(job[0]) for job in jobs)
+        futures = [self._executor.submit(self._verify_one, *job, per_host[_host_key(job[0])] == 1) for job in jobs]
+        done, not_done = wait(futures, timeout=self.deadline)
+        for future in not_done:
+            future.cancel()
+        if not_done and DEBUG_MODE:
+            print(f"[DEBUG] Portainer: {len(not_done)}/{len(jobs)} verificações excederam o prazo de {self.deadline}s")
+
+        results: List[Optional[Dict]] = []
+        for future in futures:
+            if future not in done:
+                results.append(None)
+                continue
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                if DEBUG_MODE:
+                    print(f"[DEBUG] Portainer: falha na verificação paralela: {exc}")
+                results.append(None)
+        return results
+
+
+portainer_verifier = PortainerVerifier()
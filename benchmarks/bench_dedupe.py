@@ -0,0 +1,133 @@
+"""
+Micro-benchmark do TTLCache de dedupe (app/dedupe.py).
+
+Compara a implementação anterior (dict + varredura/sort a cada touch) com a atual
+(OrderedDict em ordem de expiração) e com a tabela compacta de digests
+(ALERT_DEDUP_COMPACT=true), com o cache cheio em N chaves. Também mede a memória
+ocupada por N fingerprints em cada estrutura (tracemalloc).
+
+Uso:
+    python benchmarks/bench_dedupe.py                 # 50k e 500k chaves
+    python benchmarks/bench_dedupe.py --sizes 5000 --ops 20000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.dedupe import CompactTTLCache, TTLCache  # noqa: E402
+
+
+class LegacyTTLCache:
+    """Cópia da implementação antiga, usada só como referência."""
+
+    def __init__(self, ttl_seconds: int, max_size: int = 5000):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._store: Dict[str, float] = {}
+
+    def _evict_if_needed(self):
+        now = time.time()
+        expired_keys = [k for k, ts in self._store.items() if (now - ts) > self.ttl]
+        for k in expired_keys:
+            self._store.pop(k, None)
+        if len(self._store) > self.max_size:
+            for k in sorted(self._store, key=self._store.get)[: (len(self._store) - self.max_size)]:
+                self._store.pop(k, None)
+
+    def touch(self, key: str):
+        self._store[key] = time.time()
+        self._evict_if_needed()
+
+    def is_within_ttl(self, key: str) -> bool:
+        ts = self._store.get(key)
+        if ts is None:
+            return False
+        return (time.time() - ts) <= self.ttl
+
+
+def _key(i: int) -> str:
+    return f"container|10.0.{i % 250}.{i % 200}|svc-{i}|firing"
+
+
+def _fill(cache, size: int):
+    # Preenche direto no store: o custo do preenchimento não entra na medição
+    now = time.time()
+    if isinstance(cache, CompactTTLCache):
+        for i in range(size):
+            cache._set_locked(_key(i), now)
+        return
+    for i in range(size):
+        cache._store[_key(i)] = now
+
+
+def _memory_mb(factory, size: int) -> float:
+    """Memória (MB) alocada para guardar N fingerprints, sem contar as strings de entrada."""
+    keys = [_key(i) for i in range(size)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = factory()
+    now = time.time()
+    if isinstance(cache, CompactTTLCache):
+        for key in keys:
+            cache._set_locked(key, now)
+    else:
+        for key in keys:
+            cache._store[key] = now
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # No dict as strings são referenciadas (vivem enquanto a chave existir); na tabela compacta não
+    if not isinstance(cache, CompactTTLCache):
+        used += sum(sys.getsizeof(k) for k in keys)
+    return used / (1024 * 1024)
+
+
+def _bench(cache, size: int, ops: int) -> float:
+    """Retorna microssegundos por operação (touch de chave nova + consulta)."""
+    started = time.perf_counter()
+    for i in range(ops):
+        key = f"container|10.1.{i % 250}.{i % 200}|new-{i}|firing"
+        cache.touch(key)
+        cache.is_within_ttl(f"container|10.0.{i % 250}.{i % 200}|svc-{(i * 7919) % size}|firing")
+    return (time.perf_counter() - started) / ops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50_000, 500_000])
+    parser.add_argument('--ops', type=int, default=100_000, help='operações na implementação atual')
+    parser.add_argument('--legacy-ops', type=int, default=50, help='operações na implementação antiga (O(n log n) cada)')
+    args = parser.parse_args()
+
+    print(f"{'chaves':>10} {'antigo (us/op)':>16} {'atual (us/op)':>15} {'ganho':>10} {'compacto (us/op)':>18}")
+    for size in args.sizes:
+        legacy = LegacyTTLCache(ttl_seconds=3600, max_size=size)
+        _fill(legacy, size)
+        legacy_us = _bench(legacy, size, args.legacy_ops)
+
+        current = TTLCache(ttl_seconds=3600, max_size=size, name='bench')
+        _fill(current, size)
+        current_us = _bench(current, size, args.ops)
+        assert len(current) == size, "o cache deveria continuar no limite de max_size"
+
+        compact = CompactTTLCache(ttl_seconds=3600, max_size=size, name='bench')
+        _fill(compact, size)
+        compact_us = _bench(compact, size, args.ops)
+        assert len(compact) <= size, "o cache compacto deveria respeitar max_size"
+
+        print(f"{size:>10} {legacy_us:>16.1f} {current_us:>15.2f} {legacy_us / current_us:>9.0f}x {compact_us:>18.2f}")
+
+    print()
+    print(f"{'chaves':>10} {'dict (MB)':>12} {'compacto (MB)':>15}")
+    for size in args.sizes:
+        dict_mb = _memory_mb(lambda: TTLCache(ttl_seconds=3600, max_size=size, name='bench'), size)
+        compact_mb = _memory_mb(lambda: CompactTTLCache(ttl_seconds=3600, max_size=size, name='bench'), size)
+        print(f"{size:>10} {dict_mb:>12.1f} {compact_mb:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,39 @@
+import logging
+import signal
+import sys
+
 from app.controller import create_app
-from app.constants import APP_PORT, DEBUG_MODE
+from app.constants import APP_PORT, DEBUG_MODE, SERVER_MODE, SERVER_THREADS
+
+logger = logging.getLogger(__name__)
 
 
 app = create_app()
 
+
+def _handle_sigterm(signum, frame):
+    # Converte SIGTERM (docker stop) em saída normal para rodar os hooks de atexit
+    # (ex.: drenar a fila de entrega ao Discord)
+    sys.exit(0)
+
+
+def serve():
+    """Sobe o servidor HTTP conforme SERVER_MODE (production = waitress multi-thread)."""
+    if SERVER_MODE == 'production':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logger.warning("waitress não instalado; usando o servidor do Flask (SERVER_MODE=production)")
+        else:
+            if DEBUG_MODE:
+                print(f"[DEBUG] Servindo com waitress na porta {APP_PORT} (threads={SERVER_THREADS})")
+            waitress_serve(app, host='0.0.0.0', port=APP_PORT, threads=max(1, SERVER_THREADS), ident='grafana-discord-proxy')
+            return
+    # threaded=True: o servidor do Flask também atende requisições em paralelo
+    # (use_reloader=False evita um segundo processo com seu próprio estado/fila)
+    app.run(host='0.0.0.0', port=APP_PORT, debug=DEBUG_MODE, threaded=True, use_reloader=False)
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=APP_PORT, debug=DEBUG_MODE)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    serve()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import delivery, outbox  # noqa: E402
+
+WEBHOOK = 'https://discord.example/api/webhooks/1/token'
+
+
+class _Resp:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class RetryBacklogTest(unittest.TestCase):
+    def test_backlog_is_delivered_while_traffic_keeps_arriving(self):
+        """Tráfego contínuo durante o backoff não pode adiar o reenvio indefinidamente."""
+        lock = threading.Lock()
+        calls = []
+
+        def fake_send(content=None, embeds=None, webhook_url=None):
+            with lock:
+                calls.append(content)
+                # Só o primeiro envio falha
+                return _Resp(503 if len(calls) == 1 else 204)
+
+        queue = delivery.DeliveryQueue(max_size=1000, workers=1, coalesce=False)
+        with mock.patch.object(delivery, 'send_discord_payload', fake_send), \
+                mock.patch.object(delivery, 'DELIVERY_RETRY_BASE_SECONDS', 0.2), \
+                mock.patch.object(delivery, 'DELIVERY_RETRY_MAX_SECONDS', 0.8):
+            queue.start()
+            total = 0
+            deadline = time.monotonic() + 2.0
+            while time.monotonic() < deadline:
+                self.assertTrue(queue.enqueue(content=f"alerta {total}", webhook_url=WEBHOOK))
+                total += 1
+                time.sleep(0.05)
+            # O backlog já precisa ter saído enquanto o tráfego continuava
+            self.assertGreater(queue.stats()['sent'], 0)
+            self.assertTrue(queue.drain(timeout=5.0))
+
+        stats = queue.stats()
+        self.assertEqual(stats['sent'], total)
+        self.assertEqual(stats['retry_buffer'], 0)
+        self.assertEqual(stats['failed'], 0)
+        # A mensagem que falhou foi reenviada na frente das que chegaram depois
+        self.assertEqual(calls[0], 'alerta 0')
+        self.assertTrue(calls[1].startswith('alerta 0\n'))
+
+
+class OutboxReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.box = outbox.Outbox(path=os.path.join(self.tmpdir, 'outbox.jsonl'), enabled=True)
+        self.box.open()
+
+    def tearDown(self):
+        self.box.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_dropped_message_is_replayed_from_the_outbox(self):
+        in_send = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fake_send(content=None, embeds=None, webhook_url=None):
+            calls.append(content)
+            in_send.set()
+            release.wait(5)
+            return _Resp(204)
+
+        queue = delivery.DeliveryQueue(max_size=1, workers=1, coalesce=False, replay_seconds=3600)
+        with mock.patch.object(delivery, 'discord_outbox', self.box), \
+                mock.patch.object(delivery, 'send_discord_payload', fake_send):
+            queue.start()
+            self.assertTrue(queue.enqueue(content='a', webhook_url=WEBHOOK))
+            self.assertTrue(in_send.wait(5))
+            self.assertTrue(queue.enqueue(content='b', webhook_url=WEBHOOK))
+            # Worker ocupado e fila cheia: 'c' é descartado, mas segue pendente no outbox
+            self.assertFalse(queue.enqueue(content='c', webhook_url=WEBHOOK))
+            self.assertEqual(self.box.parked_count(), 1)
+            self.assertEqual(self.box.pending_count(), 3)
+
+            release.set()
+            deadline = time.monotonic() + 5
+            while queue.stats()['sent'] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(queue._replay_parked(), 1)
+            self.assertTrue(queue.drain(timeout=5.0))
+
+        self.assertEqual(calls, ['a', 'b', 'c'])
+        self.assertEqual(queue.stats()['outbox_replayed'], 1)
+        self.assertEqual(self.box.pending_count(), 0)
+        self.assertEqual(self.box.parked_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
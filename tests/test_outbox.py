@@ -0,0 +1,51 @@
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import outbox  # noqa: E402
+
+
+class OutboxRewriteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'outbox.jsonl')
+        self.box = outbox.Outbox(path=self.path, enabled=True, fsync_interval_ms=10_000, compact_every=1_000)
+        self.box.open()
+
+    def tearDown(self):
+        self.box.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _reopen_pending(self):
+        return {entry['content'] for entry in outbox.Outbox(path=self.path, enabled=True).open()}
+
+    def test_failed_compaction_keeps_the_log_open(self):
+        first = self.box.put(content='a')
+        self.box.put(content='b')
+        self.box.done([first])
+        with mock.patch.object(outbox.os, 'fsync', side_effect=OSError(errno.ENOSPC, 'No space left on device')):
+            self.box.compact()
+        self.assertTrue(self.box.is_open)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+        # Gravações seguintes continuam indo para o log
+        self.assertIsNotNone(self.box.put(content='c'))
+        self.box.close()
+        self.assertEqual(self._reopen_pending(), {'b', 'c'})
+
+    def test_compaction_swaps_to_the_new_log(self):
+        first = self.box.put(content='a')
+        self.box.done([first])
+        self.box.compact()
+        self.box.put(content='b')
+        self.box.close()
+        self.assertEqual(self._reopen_pending(), {'b'})
+
+
+if __name__ == '__main__':
+    unittest.main()